@@ -0,0 +1,127 @@
+"""Fila de otimizações compartilhada por todas as sessões do processo.
+
+Um único `Agendador` (criado com st.cache_resource no app) executa as
+otimizações num pool limitado de threads. Pedidos além de `max_fila` tarefas
+esperando são recusados com `FilaCheia`, e um pedido idêntico a uma tarefa
+ainda na fila ou rodando (mesma chave_execucao) recebe a tarefa existente em
+vez de iniciar outra. As sessões acompanham a tarefa consultando o progresso;
+`metricas()` expõe profundidade da fila e latências para monitoramento.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAX_TRABALHADORES = int(os.environ.get("GA_MAX_TRABALHADORES", 2))
+MAX_FILA = int(os.environ.get("GA_MAX_FILA", 8))
+
+
+class FilaCheia(RuntimeError):
+    """A fila já tem `max_fila` tarefas esperando"""
+
+
+class Tarefa:
+    """Uma otimização agendada: estado, último progresso (g, log) e resultado"""
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.estado = "na fila"  # "rodando", "concluída" ou "falhou"
+        self.criada = time.monotonic()
+        self.iniciada = None
+        self.terminada = None
+        self.progresso = (0, [])
+        self.resultado = None
+        self.excecao = None
+        self._fim = threading.Event()
+
+    def __call__(self, g, log):
+        """Callback de progresso do motor; a sessão lê `progresso` quando quiser"""
+        self.progresso = (g, log)
+
+    @property
+    def concluida(self):
+        return self._fim.is_set()
+
+    def aguardar(self, segundos=None):
+        """Espera o fim da tarefa por até `segundos`; devolve se ela terminou"""
+        return self._fim.wait(segundos)
+
+
+class Agendador:
+    """Pool limitado de trabalhadores com admissão na fila e deduplicação por chave"""
+
+    def __init__(self, max_trabalhadores=MAX_TRABALHADORES, max_fila=MAX_FILA, historico=100):
+        self.max_trabalhadores = max_trabalhadores
+        self.max_fila = max_fila
+        self._executor = ThreadPoolExecutor(max_workers=max_trabalhadores, thread_name_prefix="otimizacao")
+        self._lock = threading.Lock()
+        self._ativas = {}  # chave -> Tarefa na fila ou rodando
+        self._latencias = deque(maxlen=historico)  # (espera, execução) das últimas tarefas
+        self.contagens = {"aceitas": 0, "deduplicadas": 0, "recusadas": 0, "falhas": 0}
+
+    def submeter(self, chave, funcao):
+        """Agenda `funcao(progresso)` e devolve (tarefa, nova).
+
+        Com uma tarefa de mesma chave ainda ativa, devolve essa tarefa e
+        nova=False. Levanta FilaCheia se já houver `max_fila` tarefas esperando.
+        """
+        with self._lock:
+            tarefa = self._ativas.get(chave)
+            if tarefa is not None:
+                self.contagens["deduplicadas"] += 1
+                return tarefa, False
+            if self._na_fila() >= self.max_fila:
+                self.contagens["recusadas"] += 1
+                raise FilaCheia(f"{self.max_fila} otimizações já aguardam na fila")
+            tarefa = Tarefa(chave)
+            self._ativas[chave] = tarefa
+            self.contagens["aceitas"] += 1
+        self._executor.submit(self._executar, tarefa, funcao)
+        return tarefa, True
+
+    def posicao(self, tarefa):
+        """Quantas tarefas esperam à frente desta (0 se já está rodando ou terminou)"""
+        with self._lock:
+            if tarefa.estado != "na fila":
+                return 0
+            return sum(1 for t in self._ativas.values() if t.estado == "na fila" and t.criada < tarefa.criada)
+
+    def metricas(self):
+        """Profundidade da fila, tarefas rodando, contagens e latências (segundos) recentes"""
+        with self._lock:
+            latencias = np.array(self._latencias, dtype=np.float64).reshape(-1, 2)
+            metricas = {
+                "na_fila": self._na_fila(),
+                "rodando": sum(1 for t in self._ativas.values() if t.estado == "rodando"),
+                "max_trabalhadores": self.max_trabalhadores,
+                "max_fila": self.max_fila,
+                **self.contagens,
+            }
+        for nome, coluna in (("espera", latencias[:, 0]), ("execucao", latencias[:, 1])):
+            metricas[f"{nome}_media_s"] = float(coluna.mean()) if len(coluna) else None
+            metricas[f"{nome}_p95_s"] = float(np.percentile(coluna, 95)) if len(coluna) else None
+        return metricas
+
+    def _na_fila(self):
+        return sum(1 for t in self._ativas.values() if t.estado == "na fila")
+
+    def _executar(self, tarefa, funcao):
+        tarefa.iniciada = time.monotonic()
+        tarefa.estado = "rodando"
+        try:
+            tarefa.resultado = funcao(tarefa)
+            tarefa.estado = "concluída"
+        except Exception as erro:
+            tarefa.excecao = erro
+            tarefa.estado = "falhou"
+        finally:
+            tarefa.terminada = time.monotonic()
+            with self._lock:
+                self._ativas.pop(tarefa.chave, None)
+                self._latencias.append((tarefa.iniciada - tarefa.criada, tarefa.terminada - tarefa.iniciada))
+                if tarefa.excecao is not None:
+                    self.contagens["falhas"] += 1
+            tarefa._fim.set()
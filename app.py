@@ -2,14 +2,15 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from deap import base, creator, tools, algorithms
-import random
+from deap import tools
 from datetime import datetime
-from io import BytesIO
-import requests
-import time
-import copy
-import concurrent.futures
+import json
+import os
+
+import agendador
+import dados
+import motor
+import perfil
 
 # Configuração da página com layout wide e ícone
 st.set_page_config(page_title="GA Tesouro Direto Otimizador", layout="wide", page_icon="📈")
@@ -59,38 +60,27 @@ with st.expander("ℹ️ Como o Score é Calculado", expanded=False):
     O **score** do portfólio é calculado de forma multiobjetivo, otimizando **retorno**, **risco** e **diversificação** simultaneamente usando NSGA-II. O algoritmo busca automaticamente o melhor equilíbrio entre esses critérios, gerando uma fronteira de Pareto com várias opções de portfólios para você escolher.
 
     - **Retorno** 📊: Média das taxas anuais dos títulos do portfólio.
-    - **Risco** ⏳: Desvio padrão das rentabilidades, indicando a volatilidade.
+    - **Risco** ⏳: Desvio padrão das rentabilidades ou, com o modelo de covariância, a volatilidade histórica do preço (PU) do portfólio.
     - **Diversificação** 🌟: Quantidade de tipos diferentes de títulos no portfólio.
 
     > O app sempre utiliza otimização multiobjetivo, não sendo necessário escolher uma estratégia manualmente.
     """)
 
 # Função para carregar dados com cache para eficiência
-@st.cache_data(ttl=3600)  # Cache por 1 hora
+@st.cache_data(ttl=3600)  # Cache em memória por 1 hora; o cache em disco só é refeito se a fonte mudar
 def carregar_dados():
     try:
-        url = "https://drive.usercontent.google.com/uc?id=1aYGWSsM0A2slQwfC-nwz-WR7e3-WnVXM&export=download"
-        r = requests.get(url, stream=True, timeout=30)
-        r.raise_for_status()
-        content = BytesIO()
-        for chunk in r.iter_content(1024):
-            content.write(chunk)
-        content.seek(0)
-        df = pd.read_csv(content, sep=";", encoding="utf-8")
-        
-        # Processamento de dados
-        df["Data Vencimento"] = pd.to_datetime(df["Data Vencimento"], dayfirst=True, errors="coerce")
-        df["Data Base"] = pd.to_datetime(df["Data Base"], dayfirst=True, errors="coerce")
-        df["Rentabilidade"] = df["Taxa Compra Manha"].str.replace(",", ".").astype(float)
-        df["Prazo"] = (df["Data Vencimento"] - df["Data Base"]).dt.days
-        return df
+        df, meta = dados.carregar_base()
+        if meta.get("aviso"):
+            st.warning(f"Fonte indisponível, usando a última cópia local dos dados: {meta['aviso']}")
+        return df, meta
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(columns=dados.COLUNAS_CSV), {}
 
 # Carregar dados com spinner visual
-with st.spinner("📥 Baixando dados do Tesouro Direto..."):
-    raw_df = carregar_dados()
+with st.spinner("📥 Carregando dados do Tesouro Direto..."):
+    raw_df, meta_dados = carregar_dados()
 
 # Filtrar títulos futuros
 raw_df = raw_df[raw_df["Data Vencimento"] > datetime.now()].copy()
@@ -99,11 +89,23 @@ if raw_df.empty:
     st.error("Nenhum título com vencimento futuro disponível. Tente novamente mais tarde.")
     st.stop()
 
-st.success(f"✅ {len(raw_df)} títulos com vencimento futuro carregados.")
+# Universo do GA: só a cotação mais recente de cada título
+universo = dados.construir_universo(raw_df)
+
+st.success(f"✅ {len(raw_df)} cotações com vencimento futuro carregadas ({len(universo.df)} títulos distintos).")
 
 # Exibir prévia dos dados em um expander para não poluir a tela
 with st.expander("📋 Prévia dos Dados", expanded=False):
     st.dataframe(raw_df.head())
+    ingestao = meta_dados.get("ingestao")
+    if ingestao:
+        st.caption(
+            f"Última ingestão: {ingestao['linhas_lidas']:,} linhas lidas, {ingestao['linhas_mantidas']:,} mantidas, "
+            f"{ingestao['linhas_por_segundo']:,.0f} linhas/s"
+            + (f", pico de memória {ingestao['pico_memoria_bytes'] / 2**20:.1f} MB" if ingestao.get("pico_memoria_bytes") else "")
+            + (f", crescimento máximo da RSS {ingestao['pico_rss_bytes'] / 2**20:.1f} MB"
+               if ingestao.get("pico_rss_bytes") is not None else "")
+        )
 
 # Sidebar com parâmetros, organizado visualmente
 st.sidebar.header("⚙️ Parâmetros do Algoritmo")
@@ -111,7 +113,7 @@ POP_SIZE = st.sidebar.slider("Tamanho da População", 50, 500, 100, step=50, he
 NGEN = st.sidebar.slider("Máximo de Gerações", 10, 500, 100, step=10, help="Quantas iterações o algoritmo fará. Mais gerações aumentam a chance de encontrar bons portfólios.")
 CXPB = st.sidebar.slider("Probabilidade de Crossover", 0.5, 1.0, 0.7, step=0.05, help="Chance de combinar portfólios (recombinação genética). Valores altos aumentam a exploração.")
 MUTPB = st.sidebar.slider("Probabilidade de Mutação", 0.5, 1.0, 0.9, step=0.05, help="Chance de alterar portfólios (introduzir novidades). Valores altos aumentam a diversidade.")
-N_ATIVOS = st.sidebar.slider("Títulos por Portfólio", 3, min(10, len(raw_df)), 5, help="Quantos títulos em cada portfólio. Portfólios maiores tendem a ser mais diversificados.")
+N_ATIVOS = st.sidebar.slider("Títulos por Portfólio", 3, min(10, len(universo.df)), 5, help="Quantos títulos em cada portfólio. Portfólios maiores tendem a ser mais diversificados.")
 # Estratégia agora é sempre multiobjetivo, mas mantenho o selectbox para explicar
 st.sidebar.selectbox("Estratégia de Score", ["Multi-Objetivo"], help="Agora sempre otimiza retorno, risco e diversidade simultaneamente (NSGA-II).", index=0, disabled=True)
 
@@ -120,263 +122,239 @@ with st.sidebar.expander("🔧 Parâmetros Avançados", expanded=False):
     ELITE_SIZE = st.slider("Tamanho da Elite (%)", 5, 20, 10, step=5, help="Percentual dos melhores indivíduos a preservar em cada geração.")
     TOURNAMENT_SIZE = st.slider("Tamanho do Torneio", 2, 8, 4, step=1, help="Tamanho do torneio para seleção dos pais.")
     DIVERSITY_THRESHOLD = st.slider("Limiar de Diversidade", 0.1, 0.9, 0.3, step=0.1, help="Limiar para reinicialização por diversidade. Se a população ficar muito parecida, parte dela é renovada.")
+    MOTOR = st.selectbox("Motor do Algoritmo", ["DEAP (listas)", "NumPy (matriz)"], index=0, help="DEAP avalia um indivíduo por vez com listas Python. NumPy guarda a população numa matriz de inteiros e aplica crossover, mutação e reparo em lote.")
+    N_ILHAS = st.slider("Ilhas (processos)", 1, max(2, os.cpu_count() or 1), 1, help="Com mais de uma ilha, a população é repartida entre processos (motor NumPy) e os melhores portfólios migram entre eles. Execuções pequenas demais para compensar o custo de iniciar os processos rodam num processo só.")
+    INTERVALO_MIGRACAO = st.slider("Intervalo de migração", 1, 50, 10, help="Gerações entre duas migrações entre ilhas.", disabled=N_ILHAS == 1)
+    ACOMPANHAR_AO_VIVO = st.checkbox("Acompanhar ao vivo", value=True, help="Redesenha o gráfico de evolução durante a otimização. Desligue para a máxima velocidade: o gráfico aparece só ao final.")
+    ATUALIZACOES_POR_SEGUNDO = st.slider("Atualizações por segundo", 1, 10, 4, help="Número máximo de redesenhos do gráfico por segundo.", disabled=not ACOMPANHAR_AO_VIVO)
+    WARM_START = st.checkbox("Warm start (partir da última fronteira)", value=False, disabled="semente_warm_start" not in st.session_state, help="Semeia a população inicial com a fronteira de Pareto e a elite da última execução; títulos que saíram da base são descartados e o restante é sorteado.")
+    PARADA = st.selectbox("Critério de Parada", ["Hipervolume (fronteira inteira)", "Melhor retorno"], index=0, help="Hipervolume: para quando o volume dominado pela fronteira (retorno, risco e diversidade) deixa de crescer mais que 0,1% por 20 gerações. Melhor retorno: critério antigo, só pelo retorno do melhor portfólio.")
+    RISCO = st.selectbox("Modelo de Risco", ["Desvio padrão das taxas", "Covariância histórica (PU)"], index=0, disabled="PU" not in raw_df.columns, help="Desvio padrão: dispersão das taxas de compra dos títulos do portfólio. Covariância: volatilidade anualizada do portfólio com pesos iguais, a partir da covariância dos retornos diários do preço unitário (PU) de cada título no histórico.")
+    MEDIR_FASES = st.checkbox("Medir tempos por fase", value=True, help="Registra o tempo de variação, reparo, avaliação, seleção, diversidade, reinicialização e renderização em cada geração (aba Performance).")
+    RISCO_COVARIANCIA = RISCO == "Covariância histórica (PU)"
+    PODAR_UNIVERSO = st.checkbox("Podar títulos redundantes", value=False, disabled=RISCO_COVARIANCIA, help="Títulos do mesmo tipo com a mesma rentabilidade são equivalentes para os três objetivos; mantém só o necessário de cada grupo. Indisponível com o risco por covariância, em que cada título tem o próprio histórico.")
+
+@st.cache_resource(max_entries=2, ttl=3600)
+def obter_modelo_risco(_df, versao_dados, n_linhas):
+    """Covariância dos retornos do PU, calculada só quando o risco por covariância é escolhido
+    e reaproveitada entre reruns e sessões enquanto o dataset não mudar"""
+    return dados.modelo_risco(_df)
+
+if RISCO_COVARIANCIA:
+    with st.spinner("📐 Calculando a covariância dos retornos dos títulos..."):
+        modelo_risco = obter_modelo_risco(raw_df, meta_dados.get("sha256"), len(raw_df))
+    try:
+        universo = dados.construir_universo(raw_df, risco=modelo_risco)
+    except ValueError as erro:
+        st.error(f"❌ {erro}")
+        st.stop()
+elif PODAR_UNIVERSO:
+    universo = dados.construir_universo(raw_df, podar=True, n_ativos=N_ATIVOS)
+titulos_df = universo.df
 
 # Validação de parâmetros
-if len(raw_df) < N_ATIVOS:
-    st.error(f"❌ Quantidade de títulos disponíveis ({len(raw_df)}) é menor que o número por portfólio ({N_ATIVOS}). Ajuste os parâmetros.")
+if len(titulos_df) < N_ATIVOS:
+    st.error(f"❌ Quantidade de títulos disponíveis ({len(titulos_df)}) é menor que o número por portfólio ({N_ATIVOS}). Ajuste os parâmetros.")
     st.stop()
 
-# Configurações do DEAP - CORREÇÃO DOS ERROS DE LINTER
-try:
-    del creator.FitnessMax  # type: ignore
-except:
-    pass
-try:
-    del creator.FitnessMulti  # type: ignore
-except:
-    pass
-try:
-    del creator.Individual  # type: ignore
-except:
-    pass
-
-# Fitness para problemas single-objective e multi-objective
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))  # type: ignore
-creator.create("FitnessMulti", base.Fitness, weights=(1.0, -1.0, 1.0))  # Retorno (max), Risco (min), Diversidade (max)
-creator.create("Individual", list, fitness=creator.FitnessMulti)  # type: ignore
-
-# Funções auxiliares melhoradas
-def gerar_indices():
-    """Gera índices únicos para representar um portfólio"""
-    return random.sample(range(len(raw_df)), N_ATIVOS)
-
-def repair(ind):
-    """Repara indivíduo removendo duplicatas e garantindo tamanho correto"""
-    unique = list(dict.fromkeys(ind))
-    while len(unique) < N_ATIVOS:
-        novo = random.randint(0, len(raw_df) - 1)
-        if novo not in unique:
-            unique.append(novo)
-    return unique[:N_ATIVOS]
-
-def calcular_diversidade(populacao):
-    """Calcula a diversidade da população baseada na distância média entre indivíduos"""
-    if len(populacao) < 2:
-        return 0.0
-    
-    distancias = []
-    for i in range(len(populacao)):
-        for j in range(i+1, len(populacao)):
-            # Distância baseada na sobreposição de títulos
-            overlap = len(set(populacao[i]) & set(populacao[j])) / N_ATIVOS
-            distancias.append(1 - overlap)
-    
-    return np.mean(distancias) if distancias else 0.0
-
-# Operadores genéticos melhorados
-def crossover_uniforme(ind1, ind2):
-    """Crossover uniforme melhorado para portfólios"""
-    child1 = []
-    child2 = []
-    
-    # Usar máscara aleatória para decidir de qual pai pegar cada posição
-    mask = [random.random() < 0.5 for _ in range(N_ATIVOS)]
-    
-    for i in range(N_ATIVOS):
-        if mask[i]:
-            child1.append(ind1[i])
-            child2.append(ind2[i])
-        else:
-            child1.append(ind2[i])
-            child2.append(ind1[i])
-    
-    # Reparar duplicatas
-    child1 = repair(child1)
-    child2 = repair(child2)
-    
-    return creator.Individual(child1), creator.Individual(child2)  # type: ignore
-
-def mutacao_inteligente(ind, indpb=0.3):
-    """Mutação inteligente que preserva alguns títulos bons"""
-    if random.random() < indpb:
-        ind_copy = list(ind)
-        
-        # Mutação por substituição parcial
-        num_mutations = max(1, int(N_ATIVOS * 0.3))  # 30% dos títulos
-        positions = random.sample(range(N_ATIVOS), num_mutations)
-        
-        for pos in positions:
-            # Substituir por um título aleatório
-            novo_titulo = random.randint(0, len(raw_df) - 1)
-            while novo_titulo in ind_copy:
-                novo_titulo = random.randint(0, len(raw_df) - 1)
-            ind_copy[pos] = novo_titulo
-        
-        return creator.Individual(ind_copy),  # type: ignore
-    return ind,
-
-def mutacao_swap(ind, indpb=0.2):
-    """Mutação por troca de posições"""
-    if random.random() < indpb:
-        ind_copy = list(ind)
-        # Trocar duas posições aleatórias
-        pos1, pos2 = random.sample(range(N_ATIVOS), 2)
-        ind_copy[pos1], ind_copy[pos2] = ind_copy[pos2], ind_copy[pos1]
-        return creator.Individual(ind_copy),  # type: ignore
-    return ind,
-
-# Função de avaliação adaptada para NSGA-II
-
-def evaluate(ind):
-    try:
-        selected = raw_df.iloc[ind]
-        # Sempre retornar os três objetivos para NSGA-II
-        retorno = selected["Rentabilidade"].mean()
-        risco = selected["Rentabilidade"].std() or 0.1
-        diversidade = selected["Tipo Titulo"].nunique()
-        return (retorno, risco, diversidade)
-    except Exception as e:
-        st.warning(f"Erro na avaliação: {e}")
-        return (0.0, 0.1, 1.0)
-
-# Cria toolbox e registrar funções melhoradas
-toolbox = base.Toolbox()
-toolbox.register("indices", gerar_indices)
-toolbox.register("individual", tools.initIterate, creator.Individual, toolbox.indices)  # type: ignore
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)  # type: ignore
-toolbox.register("mate", crossover_uniforme)
-toolbox.register("mutate", mutacao_inteligente)
-toolbox.register("mutate_swap", mutacao_swap)
-toolbox.register("evaluate", evaluate)
-
-# Seleção adaptada: NSGA-II para multiobjetivo, torneio para os demais
-toolbox.unregister("select") if hasattr(toolbox, "select") else None
-toolbox.register("select", tools.selNSGA2)
-# Trocar fitness dos indivíduos existentes para multiobjetivo
-creator.Individual.fitness = creator.FitnessMulti
-
-# Paralelização: usar ThreadPoolExecutor para compatibilidade com Streamlit
-pool = concurrent.futures.ThreadPoolExecutor()
-toolbox.register("map", pool.map)
-
-# Função para plotar evolução com tema visual melhorado
-def plot_evolucao(log):
-    gens, melhores, medias = zip(*log) if log else ([], [], [])
-    fig, ax = plt.subplots(figsize=(6, 4))
-    plt.style.use('seaborn-v0_8')
-    ax.plot(gens, melhores, label="Melhor Score", color='green', linewidth=2)
-    ax.plot(gens, medias, label="Média da População", color='blue', linestyle='--', linewidth=1.5)
-    ax.set_title("Evolução da Otimização", fontsize=12)
-    ax.set_xlabel("Geração", fontsize=10)
-    ax.set_ylabel("Score", fontsize=10)
-    ax.legend(fontsize=8)
-    ax.grid(True, linestyle='--', alpha=0.7)
-    ax.tick_params(labelsize=8)
-    fig.tight_layout()
-    return fig
-
-# Função principal de otimização melhorada
-def rodar_otimizacao():
-    """Algoritmo genético melhorado com diversidade e early stopping"""
-    # Seed fixo para reproducibilidade
-    random.seed(42)
-    
-    # Inicializar população
-    pop = toolbox.population(n=POP_SIZE)  # type: ignore
-    # Avaliação paralela da população inicial
-    fitnesses = list(toolbox.__getattribute__('map')(toolbox.__getattribute__('evaluate'), pop))
-    for ind, fit in zip(pop, fitnesses):
-        ind.fitness.values = fit  # type: ignore
-
-    # Placeholder para gráfico e barra de progresso
-    grafico_area = st.empty()
-    progress_bar = st.progress(0)
-    log = []
-    best_score = -np.inf
-    no_improvement = 0
-    early_stop_limit = 20  # Aumentado para dar mais chance
-    elite_size = max(1, int(POP_SIZE * ELITE_SIZE / 100))
-
-    for g in range(1, NGEN + 1):
-        offspring = algorithms.varAnd(pop, toolbox, cxpb=CXPB, mutpb=MUTPB)
-        for ind in offspring:
-            ind[:] = repair(ind)
-            fit = toolbox.__getattribute__('evaluate')(ind)
-            ind.fitness.values = fit  # Avaliação sequencial para garantir atualização do gráfico
-
-        # Elitismo melhorado
-        elite = tools.selBest(pop, k=elite_size)
-        pop = toolbox.select(pop + offspring, k=POP_SIZE - len(elite)) + elite  # type: ignore
-
-        # Calcular métricas
-        melhor = tools.selBest(pop, k=1)[0]
-        media = np.mean([i.fitness.values[0] for i in pop if i.fitness.valid])
-        log.append((g, melhor.fitness.values[0], media))
+# Colunas do universo pré-computadas uma única vez para a avaliação vetorizada
+problema = motor.Problema.do_dataframe(titulos_df, covariancia=universo.covariancia)
+
+@st.cache_resource(max_entries=4)
+def obter_cache_fitness(versao_dados):
+    """Um cache de fitness por versão do dataset, reaproveitado entre reruns e sessões"""
+    return motor.CacheFitness()
+
+problema.cache = obter_cache_fitness(problema.versao)
+
+config = motor.ConfiguracaoGA(
+    pop_size=POP_SIZE,
+    ngen=NGEN,
+    cxpb=CXPB,
+    mutpb=MUTPB,
+    n_ativos=N_ATIVOS,
+    elite_size=ELITE_SIZE,
+    tournament_size=TOURNAMENT_SIZE,
+    diversity_threshold=DIVERSITY_THRESHOLD,
+    motor="numpy" if MOTOR == "NumPy (matriz)" else "deap",
+    parada="retorno" if PARADA == "Melhor retorno" else "hipervolume",
+    n_ilhas=N_ILHAS,
+    intervalo_migracao=INTERVALO_MIGRACAO,
+    risco="covariancia" if RISCO_COVARIANCIA else "desvio",
+)
+
+def tabela_evolucao(log):
+    return pd.DataFrame(log, columns=["Geração", "Melhor Score", "Média da População", "Hipervolume"]).set_index("Geração")
 
-        # Atualizar gráfico em tempo real
-        fig = plot_evolucao(log)
-        grafico_area.pyplot(fig)
-        plt.close(fig)
+def graficos_evolucao(tabela, area_score, area_hipervolume):
+    area_score.line_chart(tabela[["Melhor Score", "Média da População"]], x_label="Geração", y_label="Score")
+    area_hipervolume.line_chart(tabela["Hipervolume"], x_label="Geração", y_label="Hipervolume")
 
-        # Atualizar progresso
-        progress_bar.progress(g / NGEN)
+def otimizar(problema, config, inicial, medir, chave_cache, cache_resultados):
+    """Executada por um trabalhador do agendador: roda o motor e guarda o resultado no cache.
 
-        # Early stopping melhorado
-        if melhor.fitness.values[0] > best_score:
-            best_score = melhor.fitness.values[0]
-            no_improvement = 0
+    Não usa st.*: a sessão que acompanha a tarefa é quem redesenha o progresso.
+    """
+    def executar(progresso):
+        medicao = perfil.Perfil() if medir else perfil.NULO
+        resultado = motor.rodar_otimizacao(problema, config, progresso, inicial, medicao)
+        cache_resultados.guardar(chave_cache, resultado)
+        return resultado
+    return executar
+
+def acompanhar(tarefa, medir):
+    """Redesenha o progresso da tarefa no máximo ATUALIZACOES_POR_SEGUNDO vezes
+    por segundo (ou só espera, sem acompanhamento ao vivo) até ela terminar.
+
+    O gráfico é desenhado aqui, na sessão, e não no trabalhador: com `medir`,
+    devolve um perfil com o tempo de cada redesenho (fase "renderização").
+    """
+    renderizacao = perfil.Perfil() if medir else perfil.NULO
+    situacao = st.empty()
+    grafico_area = st.empty()
+    hipervolume_area = st.empty()
+    progress_bar = st.progress(0)
+    intervalo = 1.0 / ATUALIZACOES_POR_SEGUNDO if ACOMPANHAR_AO_VIVO else 0.5
+    while True:
+        terminou = tarefa.concluida
+        if tarefa.estado == "na fila":
+            situacao.info(f"⏳ Otimização na fila: {obter_agendador().posicao(tarefa)} à frente.")
         else:
-            no_improvement += 1
-        
-        # Verificar diversidade
-        diversidade = calcular_diversidade(pop)
-        if diversidade < DIVERSITY_THRESHOLD and g > 10:
-            # Reinicializar parte da população para manter diversidade
-            num_reinit = int(POP_SIZE * 0.2)
-            for _ in range(num_reinit):
-                novo_ind = toolbox.individual()  # type: ignore
-                novo_ind.fitness.values = toolbox.evaluate(novo_ind)  # type: ignore
-                pop[random.randint(0, len(pop)-1)] = novo_ind
-        
-        if no_improvement >= early_stop_limit:
-            st.info(f"🛑 Otimização parou na geração {g} devido a estagnação (sem melhorias).")
+            situacao.info("🔄 Otimizando portfólio... Aguarde!")
+        g, log = tarefa.progresso
+        if log and (ACOMPANHAR_AO_VIVO or terminou):
+            with renderizacao.fase(g, "renderização"):
+                # Gráficos nativos: só os pontos vão para o navegador, sem rasterizar figura
+                graficos_evolucao(tabela_evolucao(log[:]), grafico_area, hipervolume_area)
+        progress_bar.progress(min(g / NGEN, 1.0))
+        if terminou:
             break
-        
-        # Pequeno delay para efeito "tempo real"
-        time.sleep(0.05)  # Reduzido para melhor performance
-
-    return pop, log
+        tarefa.aguardar(intervalo)
+    situacao.empty()
+    progress_bar.empty()
+    return renderizacao
+
+@st.cache_resource
+def obter_cache_resultados():
+    """Resultados das últimas execuções, compartilhados por todas as sessões"""
+    return motor.CacheResultados()
+
+@st.cache_resource
+def obter_agendador():
+    """Fila de otimizações com trabalhadores limitados, compartilhada por todas as sessões"""
+    return agendador.Agendador()
+
+def monitorar_fila():
+    metricas = obter_agendador().metricas()
+    with st.sidebar.expander("📡 Fila de Otimizações", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Na fila", f"{metricas['na_fila']}/{metricas['max_fila']}")
+        col2.metric("Rodando", f"{metricas['rodando']}/{metricas['max_trabalhadores']}")
+        for nome, rotulo in (("espera", "Espera na fila"), ("execucao", "Execução")):
+            if metricas[f"{nome}_media_s"] is not None:
+                st.caption(f"{rotulo}: média {metricas[f'{nome}_media_s']:.2f} s, p95 {metricas[f'{nome}_p95_s']:.2f} s")
+        st.caption(f"{metricas['aceitas']} aceitas, {metricas['deduplicadas']} reaproveitadas em andamento, "
+                   f"{metricas['recusadas']} recusadas por fila cheia, {metricas['falhas']} falhas")
+
+chave_execucao = motor.chave_execucao(config, universo.versao)
+
+def concluir(resultado_otimizacao, chave, inicial, reaproveitado, renderizacao=perfil.NULO):
+    """Guarda na sessão o resultado, a semente do próximo warm start e a convergência contra a execução a frio"""
+    # A referência a frio é guardada por chave_execucao (parâmetros e dados, sem a população inicial):
+    # o warm start só é comparado com uma execução a frio dos mesmos parâmetros sobre o mesmo universo
+    referencias = st.session_state.setdefault("referencia_fria", {})
+    geracoes = motor.geracoes_ate_convergir(resultado_otimizacao)
+    economia = None
+    if not inicial:
+        referencias[chave] = (geracoes, resultado_otimizacao.geracao_parada is not None)
+    elif chave in referencias:
+        economia = (len(inicial), *referencias[chave], geracoes, resultado_otimizacao.geracao_parada is not None)
+    st.session_state["semente_warm_start"] = [
+        [universo.chaves[i] for i in portfolio]
+        for portfolio in motor.portfolios_semente(resultado_otimizacao, ELITE_SIZE)
+    ]
+    st.session_state["execucao"] = (chave, resultado_otimizacao, reaproveitado, economia, renderizacao)
 
 # Botão para rodar com estilo visual
 if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâmetros selecionados."):
-    import time as _time
-    start_time = _time.time()
-    with st.spinner("🔄 Otimizando portfólio... Aguarde!"):
-        pop, log = rodar_otimizacao()
-    elapsed = _time.time() - start_time
-    st.success(f"✅ Otimização concluída em {elapsed:.2f} segundos!")
+    # Warm start: portfólios guardados por chave de título, remapeados para o universo atual
+    inicial = None
+    if WARM_START and "semente_warm_start" in st.session_state:
+        inicial = dados.remapear_portfolios(st.session_state["semente_warm_start"], universo)[:POP_SIZE]
+    chave_cache = motor.chave_execucao(config, universo.versao, inicial)
+    resultado_otimizacao = obter_cache_resultados().obter(chave_cache)
+    # Um resultado guardado sem perfil não serve a quem pediu a medição das fases
+    if resultado_otimizacao is not None and MEDIR_FASES and not resultado_otimizacao.perfil.ativo:
+        resultado_otimizacao = None
+    if resultado_otimizacao is not None:
+        concluir(resultado_otimizacao, chave_execucao, inicial, reaproveitado=True)
+    else:
+        # Pedidos idênticos já em andamento (desta ou de outra sessão) reaproveitam a mesma tarefa;
+        # a medição das fases entra na chave para que um pedido com perfil não pegue carona num sem perfil
+        try:
+            tarefa, nova = obter_agendador().submeter(
+                (chave_cache, MEDIR_FASES), otimizar(problema, config, inicial, MEDIR_FASES, chave_cache, obter_cache_resultados())
+            )
+        except agendador.FilaCheia:
+            st.warning("🚦 Muitas otimizações na fila no momento. Tente novamente em instantes.")
+        else:
+            st.session_state["tarefa"] = (tarefa, chave_execucao, inicial, not nova)
+
+# A tarefa fica na sessão: um rerun no meio da otimização volta a acompanhá-la
+pendente = st.session_state.get("tarefa")
+if pendente is not None:
+    tarefa, chave, inicial, reaproveitado = pendente
+    renderizacao = acompanhar(tarefa, MEDIR_FASES)
+    del st.session_state["tarefa"]
+    if tarefa.excecao is not None:
+        st.error(f"❌ Erro na otimização: {tarefa.excecao}")
+    else:
+        concluir(tarefa.resultado, chave, inicial, reaproveitado, renderizacao)
+
+monitorar_fila()
+
+# O resultado fica na sessão: interações com as abas só redesenham, sem recalcular
+execucao = st.session_state.get("execucao")
+if execucao is not None and execucao[0] == chave_execucao:
+    _, resultado_otimizacao, reaproveitado, economia, renderizacao = execucao
+    pop, log, estatisticas_cache = resultado_otimizacao.populacao, resultado_otimizacao.log, resultado_otimizacao.estatisticas_cache
+    if reaproveitado:
+        st.success(f"✅ Resultado reaproveitado de uma execução idêntica (otimização original levou {resultado_otimizacao.segundos:.2f} segundos).")
+    else:
+        st.success(f"✅ Otimização concluída em {resultado_otimizacao.segundos:.2f} segundos!")
+    if economia is not None:
+        n_semeados, g_frio, frio_convergiu, g_quente, quente_convergiu = economia
+        if not (frio_convergiu or quente_convergiu):
+            st.info(f"♻️ Warm start com {n_semeados} portfólios semeados: nem ele nem a execução a frio com os mesmos parâmetros "
+                    f"estagnaram antes da geração {g_quente}.")
+        else:
+            quente = f"convergiu na geração {g_quente}" if quente_convergiu else f"não convergiu em {g_quente} gerações"
+            frio = f"convergiu na geração {g_frio}" if frio_convergiu else f"não convergiu em {g_frio} gerações"
+            diferenca = g_frio - g_quente
+            st.info(f"♻️ Warm start com {n_semeados} portfólios semeados {quente}; a execução a frio com os mesmos parâmetros {frio}: "
+                    f"{abs(diferenca)} gerações {'a menos' if diferenca >= 0 else 'a mais'}.")
+    if resultado_otimizacao.geracao_parada is not None:
+        st.info(f"🛑 Otimização parou na geração {resultado_otimizacao.geracao_parada} devido a estagnação (sem melhorias).")
+    total_consultas = estatisticas_cache["hits"] + estatisticas_cache["misses"]
+    if total_consultas:
+        st.caption(
+            f"🗃️ Cache de fitness: {estatisticas_cache['hits']} acertos, {estatisticas_cache['misses']} avaliações, "
+            f"{estatisticas_cache['evictions']} descartes (taxa de acerto {estatisticas_cache['hits'] / total_consultas:.1%})"
+        )
 
     if not pop:
         st.error("❌ Erro na otimização. Verifique os parâmetros e tente novamente.")
         st.stop()
 
     # --- NOVA INTERFACE EM TABS ---
-    tabs = st.tabs(["Resumo", "Fronteira de Pareto", "Detalhes do Portfólio", "Configurações Avançadas", "Ajuda"])
+    tabs = st.tabs(["Resumo", "Fronteira de Pareto", "Detalhes do Portfólio", "Configurações Avançadas", "Performance", "Ajuda"])
 
     # --- FRONTEIRA DE PARETO ---
     with tabs[1]:
         st.subheader("🌈 Fronteira de Pareto (Portfólios Não-Dominados)")
         # Identificar não-dominados
-        pareto = tools.sortNondominated(pop, k=len(pop), first_front_only=True)[0]
-        pareto_df = pd.DataFrame([
-            {
-                'Retorno (%)': raw_df.iloc[ind]["Rentabilidade"].mean(),
-                'Risco (%)': raw_df.iloc[ind]["Rentabilidade"].std(),
-                'Diversidade': raw_df.iloc[ind]["Tipo Titulo"].nunique(),
-                'Índices': ind
-            }
-            for ind in pareto
-        ])
+        pareto = resultado_otimizacao.pareto
+        pareto_df = motor.tabela_pareto(pareto)
         st.dataframe(pareto_df, use_container_width=True)
         # Exportar Pareto
         csv = pareto_df.to_csv(index=False).encode('utf-8')
@@ -395,7 +373,7 @@ if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâ
         # Destacar o portfólio selecionado
         ax.scatter(riscos.iloc[idx], retornos.iloc[idx], color='red', s=120, label=f'Selecionado ({idx+1})')
         ax.set_title("Fronteira de Pareto (Risco x Retorno)", fontsize=12)
-        ax.set_xlabel("Risco (Desvio Padrão)", fontsize=10)
+        ax.set_xlabel("Risco (Volatilidade Histórica)" if RISCO_COVARIANCIA else "Risco (Desvio Padrão)", fontsize=10)
         ax.set_ylabel("Retorno Médio (%)", fontsize=10)
         ax.legend(fontsize=8)
         ax.grid(True, linestyle='--', alpha=0.7)
@@ -406,7 +384,7 @@ if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâ
     # --- DETALHES DO PORTFÓLIO SELECIONADO ---
     with tabs[2]:
         st.subheader(f"🔎 Detalhes do Portfólio Selecionado (Portfólio {idx+1})")
-        resultado = raw_df.iloc[port_sel].copy()
+        resultado = titulos_df.iloc[port_sel].copy()
         st.dataframe(resultado.style.format({"Rentabilidade": "{:.2f}%", "Prazo": "{:.0f} dias"}))
         # Exportar portfólio
         csv_port = resultado.to_csv(index=False).encode('utf-8')
@@ -426,7 +404,7 @@ if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâ
     with tabs[0]:
         st.subheader("🏆 Melhor Portfólio Encontrado")
         melhor = tools.selBest(pop, k=1)[0]
-        resultado = raw_df.iloc[melhor].copy()
+        resultado = titulos_df.iloc[melhor].copy()
         resultado["Score"] = melhor.fitness.values[0]
         st.dataframe(resultado.style.format({"Rentabilidade": "{:.2f}%", "Prazo": "{:.0f} dias"}))
         st.markdown(f"""
@@ -434,14 +412,16 @@ if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâ
         - **Rentabilidade Média**: {resultado["Rentabilidade"].mean():.2f}%
         - **Prazo Médio**: {resultado["Prazo"].mean():.0f} dias
         - **Diversidade de Títulos**: {resultado["Tipo Titulo"].nunique()}
-        - **Risco (Desvio Padrão)**: {resultado["Rentabilidade"].std():.2f}%
+        - **{"Risco (Volatilidade Histórica)" if RISCO_COVARIANCIA else "Risco (Desvio Padrão)"}**: {melhor.fitness.values[1] if RISCO_COVARIANCIA else resultado["Rentabilidade"].std():.2f}%
         """)
         st.info("Veja a Fronteira de Pareto para comparar outros portfólios não-dominados.")
+        st.markdown("**Evolução da Otimização**")
+        graficos_evolucao(tabela_evolucao(log), st, st)
 
     # --- CONFIGURAÇÕES AVANÇADAS ---
     with tabs[3]:
         st.subheader("⚙️ Parâmetros Avançados e Diversidade")
-        diversidade_final = calcular_diversidade(pop)
+        diversidade_final = motor.calcular_diversidade(pop, N_ATIVOS)
         st.metric("Diversidade da População Final", f"{diversidade_final:.3f}")
         # Histograma de scores
         scores = [ind.fitness.values[0] for ind in pop]
@@ -454,8 +434,30 @@ if st.button("🚀 Rodar Otimização", help="Inicie a otimização com os parâ
         ax.legend()
         st.pyplot(fig)
 
-    # --- AJUDA/TUTORIAL ---
+    # --- PERFORMANCE (TEMPOS POR FASE) ---
     with tabs[4]:
+        st.subheader("⏱️ Tempo por Fase e Geração")
+        if not resultado_otimizacao.perfil.ativo:
+            st.info("Marque \"Medir tempos por fase\" nos Parâmetros Avançados e rode a otimização para ver os tempos.")
+        else:
+            # Fases do motor (no trabalhador) e redesenhos do gráfico nesta sessão
+            medicao = perfil.juntar(resultado_otimizacao.perfil, renderizacao)
+            tempos = medicao.tabela()
+            st.bar_chart(tempos, x_label="Geração", y_label="Segundos")
+            totais = tempos.sum()
+            st.dataframe(pd.DataFrame({
+                "Segundos": totais,
+                "Participação": totais / totais.sum(),
+                "Média por Geração (ms)": tempos.mean() * 1e3,
+            }).style.format({"Segundos": "{:.3f}", "Participação": "{:.1%}", "Média por Geração (ms)": "{:.2f}"}))
+            avaliacoes = sum(c["avaliacoes"] for c in medicao.contagens.values())
+            consultas = sum(c["consultas"] for c in medicao.contagens.values())
+            st.caption(f"{avaliacoes} avaliações efetivas em {consultas} consultas à função de avaliação ({len(tempos)} gerações).")
+            st.download_button("⬇️ Baixar Perfil (JSON)", json.dumps(medicao.como_dict(), ensure_ascii=False, indent=2), "perfil.json", "application/json")
+            st.download_button("⬇️ Baixar Trace (Chrome/Perfetto)", json.dumps(medicao.trace_chrome()), "trace.json", "application/json")
+
+    # --- AJUDA/TUTORIAL ---
+    with tabs[5]:
         st.subheader("❓ Como Usar o Otimizador de Portfólio?")
         st.markdown("""
         1. Ajuste os parâmetros na barra lateral conforme seu perfil de risco.
@@ -0,0 +1,274 @@
+"""Benchmark dos caminhos quentes do GA sobre bases sintéticas do Tesouro Direto.
+
+Exemplos:
+    python benchmarks/bench_ga.py --saida bench.json
+    python benchmarks/bench_ga.py --linhas 1000 10000 --pop-size 200 --saida bench.json
+    python benchmarks/bench_ga.py --comparar antes.json depois.json
+
+As bases têm as mesmas colunas que dados.carregar_base produz e são geradas
+em memória, sem rede. Para cada tamanho mede a latência de cada operador
+(média, mediana e p95 em microssegundos), gerações por segundo e pico de
+memória de uma execução completa de motor.rodar_otimizacao sem renderização
+(uma por motor e uma com o risco por covariância), e grava tudo em JSON para
+comparar versões.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from deap import creator, tools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dados
+import motor
+import nsga2
+
+TIPOS = [
+    "Tesouro Selic",
+    "Tesouro Prefixado",
+    "Tesouro IPCA+",
+    "Tesouro Prefixado com Juros Semestrais",
+    "Tesouro IPCA+ com Juros Semestrais",
+    "Tesouro Renda+ Aposentadoria Extra",
+]
+COTACOES_POR_TITULO = 10
+
+
+def base_sintetica(n_linhas, semente=0):
+    """Histórico sintético com n_linhas cotações: COTACOES_POR_TITULO datas base por título"""
+    rng = np.random.default_rng(semente)
+    n_titulos = max(1, -(-n_linhas // COTACOES_POR_TITULO))
+    hoje = pd.Timestamp.now().normalize()
+    # Vencimentos distintos garantem n_titulos títulos no universo
+    vencimentos = hoje + pd.to_timedelta(30 + rng.permutation(n_titulos), unit="D")
+    taxas = np.round(rng.uniform(4, 13, n_titulos), 2)
+
+    titulo = np.repeat(np.arange(n_titulos), COTACOES_POR_TITULO)[:n_linhas]
+    defasagem = np.tile(np.arange(COTACOES_POR_TITULO), n_titulos)[:n_linhas]
+    df = pd.DataFrame({
+        "Tipo Titulo": pd.Categorical.from_codes(rng.integers(0, len(TIPOS), n_titulos)[titulo], categories=TIPOS),
+        "Data Vencimento": vencimentos.to_numpy()[titulo].astype("datetime64[s]"),
+        "Data Base": (hoje - pd.to_timedelta(defasagem, unit="D")).to_numpy().astype("datetime64[s]"),
+        "Rentabilidade": (taxas[titulo] + np.round(rng.normal(0, 0.05, n_linhas), 2)).astype(np.float32),
+    })
+    # PU: passeio aleatório por título com um fator comum a todos (retornos correlacionados)
+    volatilidades = rng.uniform(0.001, 0.01, n_titulos)
+    retornos = 0.5 * rng.normal(0, 0.004, COTACOES_POR_TITULO)[defasagem] + rng.normal(0, volatilidades[titulo])
+    inicio_titulo = np.r_[0, np.flatnonzero(np.diff(titulo)) + 1]
+    acumulado = np.cumsum(retornos)
+    acumulado -= np.repeat(acumulado[inicio_titulo] - retornos[inicio_titulo], np.diff(np.r_[inicio_titulo, n_linhas]))
+    df["PU"] = rng.uniform(800, 4000, n_titulos)[titulo] * np.exp(acumulado)
+    df["Prazo"] = ((df["Data Vencimento"] - df["Data Base"]) / pd.Timedelta(days=1)).astype(np.float32)
+    return df
+
+
+def cronometrar(operar, preparar=lambda: (), repeticoes=200):
+    """Latência por chamada de operar(*preparar()), sem contar o preparo"""
+    tempos = np.empty(repeticoes)
+    for i in range(repeticoes):
+        argumentos = preparar()
+        inicio = time.perf_counter_ns()
+        operar(*argumentos)
+        tempos[i] = time.perf_counter_ns() - inicio
+    tempos /= 1e3
+    return {
+        "chamadas": repeticoes,
+        "media_us": float(tempos.mean()),
+        "mediana_us": float(np.median(tempos)),
+        "p95_us": float(np.percentile(tempos, 95)),
+    }
+
+
+def medir_operacoes(problema, config, repeticoes, problema_covariancia=None):
+    n_titulos, n_ativos = problema.n_titulos, config.n_ativos
+    rng = random.Random(config.semente)
+    pop = [creator.Individual(motor.gerar_indices(n_titulos, n_ativos, rng)) for _ in range(2 * config.pop_size)]
+    for ind, fit in zip(pop, motor.evaluate_lote(problema, pop)):
+        ind.fitness.values = fit
+    metade = pop[:config.pop_size]
+
+    def sortear():
+        return rng.choice(pop)
+
+    def com_duplicata():
+        ind = sortear()
+        return ind[:-1] + [ind[0]]
+
+    return {
+        "evaluate": cronometrar(motor.evaluate, lambda: (sortear(), problema), repeticoes),
+        "evaluate_lote": cronometrar(motor.evaluate_lote, lambda: (problema, metade), repeticoes),
+        "repair": cronometrar(
+            motor.repair,
+            lambda: (com_duplicata(), n_titulos, n_ativos, rng),
+            repeticoes,
+        ),
+        "crossover_uniforme": cronometrar(
+            motor.crossover_uniforme,
+            lambda: (creator.Individual(sortear()), creator.Individual(sortear()), n_titulos, n_ativos, rng),
+            repeticoes,
+        ),
+        "mutacao_inteligente": cronometrar(
+            motor.mutacao_inteligente,
+            lambda: (creator.Individual(sortear()), n_titulos, n_ativos, rng),
+            repeticoes,
+        ),
+        "calcular_diversidade": cronometrar(motor.calcular_diversidade, lambda: (metade, n_ativos), repeticoes),
+        "selNSGA2": cronometrar(tools.selNSGA2, lambda: (pop, config.pop_size), max(1, repeticoes // 10)),
+        "nsga2.selNSGA2": cronometrar(nsga2.selNSGA2, lambda: (pop, config.pop_size), repeticoes),
+        "evaluate_lote[covariancia]": cronometrar(
+            motor.evaluate_lote, lambda: (problema_covariancia, metade), repeticoes
+        ),
+    }
+
+
+def medir_execucao(universo, config):
+    """Gerações/s de uma execução completa (cache de fitness vazio) e pico de memória de outra igual"""
+    covariancia = universo.covariancia if config.risco == "covariancia" else None
+    resultado = motor.rodar_otimizacao(motor.Problema.do_dataframe(universo.df, covariancia=covariancia), config)
+    tracemalloc.start()
+    try:
+        motor.rodar_otimizacao(motor.Problema.do_dataframe(universo.df, covariancia=covariancia), config)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "geracoes": len(resultado.log),
+        "segundos": resultado.segundos,
+        "geracoes_por_segundo": len(resultado.log) / resultado.segundos,
+        "pico_memoria_bytes": pico,
+        "melhor_score": resultado.log[-1][1],
+        "hipervolume": resultado.log[-1][3],
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar(args):
+    config_base = dict(pop_size=args.pop_size, ngen=args.ngen, n_ativos=args.n_ativos,
+                       early_stop_limit=args.ngen + 1)  # sem early stopping: gerações comparáveis
+    relatorio = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "parametros": {**config_base, "repeticoes": args.repeticoes},
+        "bases": [],
+    }
+    for n_linhas in args.linhas:
+        df = base_sintetica(n_linhas)
+        inicio = time.perf_counter()
+        universo = dados.construir_universo(df)
+        preparo = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        # Só COTACOES_POR_TITULO datas por título: aceita covariâncias com todas elas
+        risco = dados.modelo_risco(df, min_observacoes=COTACOES_POR_TITULO - 1)
+        universo_covariancia = dados.construir_universo(df, risco=risco)
+        preparo_risco = time.perf_counter() - inicio
+        problema = motor.Problema.do_dataframe(universo.df)
+        problema_covariancia = motor.Problema.do_dataframe(universo.df, covariancia=universo_covariancia.covariancia)
+        config = motor.ConfiguracaoGA(**config_base)
+        execucoes = {
+            nome: medir_execucao(universo, motor.ConfiguracaoGA(**config_base, motor=nome))
+            for nome in motor.MOTORES
+        }
+        execucoes["numpy+covariancia"] = medir_execucao(
+            universo_covariancia, motor.ConfiguracaoGA(**config_base, motor="numpy", risco="covariancia")
+        )
+        base = {
+            "linhas": n_linhas,
+            "titulos": len(universo.df),
+            "segundos_universo": preparo,
+            "segundos_modelo_risco": preparo_risco,
+            "operacoes": medir_operacoes(problema, config, args.repeticoes, problema_covariancia),
+            "execucoes": execucoes,
+        }
+        relatorio["bases"].append(base)
+        _imprimir_base(base)
+    return relatorio
+
+
+def _imprimir_base(base):
+    print(f"\n{base['linhas']} linhas, {base['titulos']} títulos (universo em {base['segundos_universo'] * 1e3:.1f} ms, "
+          f"modelo de risco em {base['segundos_modelo_risco'] * 1e3:.1f} ms)")
+    for nome, med in base["operacoes"].items():
+        print(f"  {nome:<26} média {med['media_us']:>10.1f} µs  mediana {med['mediana_us']:>10.1f} µs  p95 {med['p95_us']:>10.1f} µs")
+    for nome, ex in base["execucoes"].items():
+        print(f"  rodar_otimizacao[{nome}] {ex['geracoes_por_segundo']:>8.1f} gerações/s  "
+              f"pico {ex['pico_memoria_bytes'] / 1e6:.1f} MB")
+
+
+def comparar(caminho_antes, caminho_depois, tolerancia):
+    """Imprime a razão depois/antes de cada medida; retorna 1 se alguma piorou além da tolerância"""
+    with open(caminho_antes, encoding="utf-8") as f:
+        antes = {b["linhas"]: b for b in json.load(f)["bases"]}
+    with open(caminho_depois, encoding="utf-8") as f:
+        depois = {b["linhas"]: b for b in json.load(f)["bases"]}
+
+    regressoes = 0
+    for linhas in sorted(antes.keys() & depois.keys()):
+        print(f"\n{linhas} linhas")
+        medidas = [
+            (nome, antes[linhas]["operacoes"][nome]["mediana_us"], med["mediana_us"], "µs")
+            for nome, med in depois[linhas]["operacoes"].items() if nome in antes[linhas]["operacoes"]
+        ] + [
+            # gerações/s: maior é melhor, então compara o tempo por geração
+            (f"rodar_otimizacao[{nome}]", 1e6 / antes[linhas]["execucoes"][nome]["geracoes_por_segundo"],
+             1e6 / ex["geracoes_por_segundo"], "µs/geração")
+            for nome, ex in depois[linhas]["execucoes"].items() if nome in antes[linhas]["execucoes"]
+        ]
+        for nome, valor_antes, valor_depois, unidade in medidas:
+            razao = valor_depois / valor_antes
+            piorou = razao > 1 + tolerancia
+            regressoes += piorou
+            print(f"  {nome:<26} {valor_antes:>10.1f} -> {valor_depois:>10.1f} {unidade:<10} x{razao:.2f}"
+                  + ("  REGRESSÃO" if piorou else ""))
+    return 1 if regressoes else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do GA em bases sintéticas do Tesouro Direto")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Tamanhos das bases sintéticas (linhas de cotação)")
+    parser.add_argument("--pop-size", type=int, default=100)
+    parser.add_argument("--ngen", type=int, default=50)
+    parser.add_argument("--n-ativos", type=int, default=5)
+    parser.add_argument("--repeticoes", type=int, default=200, help="Chamadas cronometradas por operador")
+    parser.add_argument("--saida", default="bench_ga.json", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"),
+                        help="Compara dois JSONs gerados por este script em vez de medir")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Piora relativa aceita por medida em --comparar")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        return comparar(*args.comparar, args.tolerancia)
+
+    relatorio = rodar(args)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados em {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
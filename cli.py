@@ -0,0 +1,114 @@
+"""Execução do otimizador pela linha de comando, sem a interface Streamlit.
+
+Exemplo:
+    python cli.py dados/tesouro.csv --saida resultados --pop-size 200 --ngen 300 --motor numpy
+
+Grava em --saida a fronteira de Pareto (pareto.csv/pareto.json), o log por
+geração (log.csv/log.json) e a configuração usada (execucao.json), de modo que
+a mesma execução possa ser repetida com a mesma semente e o mesmo dataset.
+"""
+import argparse
+import json
+import os
+import sys
+from dataclasses import asdict, fields
+
+import pandas as pd
+
+import dados
+import motor
+import perfil
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Otimização de portfólio do Tesouro Direto (NSGA-II)")
+    parser.add_argument("fonte", help="Arquivo CSV local (ou URL) com o histórico do Tesouro Direto")
+    parser.add_argument("--saida", default="resultados", help="Diretório dos arquivos de resultado")
+    parser.add_argument("--cache-dir", default=None, help="Diretório do cache local dos dados")
+    parser.add_argument("--podar", action="store_true", help="Podar títulos redundantes do universo")
+    parser.add_argument("--warm-start", metavar="PARETO_JSON", default=None,
+                        help="Semeia a população inicial com a fronteira (pareto.json) de uma execução anterior")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Medir o tempo de cada fase por geração (perfil.json e trace.json)")
+    parser.add_argument("--quieto", action="store_true", help="Não imprimir o progresso por geração")
+    padrao = motor.ConfiguracaoGA()
+    for campo in fields(motor.ConfiguracaoGA):
+        opcao = "--" + campo.name.replace("_", "-")
+        if campo.name == "motor":
+            parser.add_argument(opcao, choices=motor.MOTORES, default=padrao.motor)
+        elif campo.name == "parada":
+            parser.add_argument(opcao, choices=motor.PARADAS, default=padrao.parada)
+        elif campo.name == "risco":
+            parser.add_argument(opcao, choices=motor.RISCOS, default=padrao.risco)
+        else:
+            parser.add_argument(opcao, type=type(getattr(padrao, campo.name)), default=getattr(padrao, campo.name))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    config = motor.ConfiguracaoGA(**{campo.name: getattr(args, campo.name) for campo in fields(motor.ConfiguracaoGA)})
+
+    df, meta = dados.carregar_base(args.fonte, args.cache_dir)
+    df = df[df["Data Vencimento"] > pd.Timestamp.now()]
+    if config.risco == "covariancia" and args.podar:
+        sys.exit("--podar não pode ser combinado com --risco covariancia.")
+    risco = dados.modelo_risco(df) if config.risco == "covariancia" else None
+    try:
+        universo = dados.construir_universo(df, podar=args.podar, n_ativos=config.n_ativos, risco=risco)
+    except ValueError as erro:
+        sys.exit(str(erro))
+    if len(universo.df) < config.n_ativos:
+        sys.exit(f"Quantidade de títulos disponíveis ({len(universo.df)}) é menor que n_ativos ({config.n_ativos}).")
+    problema = motor.Problema.do_dataframe(universo.df, covariancia=universo.covariancia)
+
+    inicial = None
+    if args.warm_start:
+        with open(args.warm_start, encoding="utf-8") as f:
+            anteriores = [[tuple(chave) for chave in registro["Títulos"]] for registro in json.load(f)]
+        inicial = dados.remapear_portfolios(anteriores, universo)[:config.pop_size]
+
+    def progresso(g, log):
+        if not args.quieto:
+            _, melhor, media, volume = log[-1]
+            print(f"geração {g}/{config.ngen}: melhor {melhor:.4f}, média {media:.4f}, hipervolume {volume:.4f}",
+                  file=sys.stderr)
+
+    medicao = perfil.Perfil() if args.perfil else perfil.NULO
+    resultado = motor.rodar_otimizacao(problema, config, progresso, inicial, medicao)
+
+    os.makedirs(args.saida, exist_ok=True)
+    pareto_df = motor.tabela_pareto(resultado.pareto)
+    pareto_df["Títulos"] = [[list(universo.chaves[i]) for i in indices] for indices in pareto_df["Índices"]]
+    pareto_df.to_csv(os.path.join(args.saida, "pareto.csv"), index=False)
+    pareto_df.to_json(os.path.join(args.saida, "pareto.json"), orient="records", force_ascii=False, indent=2)
+
+    log_df = pd.DataFrame(resultado.log, columns=["Geração", "Melhor Score", "Média da População", "Hipervolume"])
+    log_df.to_csv(os.path.join(args.saida, "log.csv"), index=False)
+    log_df.to_json(os.path.join(args.saida, "log.json"), orient="records", force_ascii=False, indent=2)
+
+    if args.perfil:
+        with open(os.path.join(args.saida, "perfil.json"), "w", encoding="utf-8") as f:
+            json.dump(medicao.como_dict(), f, ensure_ascii=False, indent=2)
+        with open(os.path.join(args.saida, "trace.json"), "w", encoding="utf-8") as f:
+            json.dump(medicao.trace_chrome(), f, ensure_ascii=False)
+
+    execucao = {
+        "configuracao": asdict(config),
+        "dados": {"fonte": args.fonte, "sha256": meta.get("sha256"), "versao_universo": problema.versao,
+                  "titulos": len(universo.df)},
+        "warm_start": {"arquivo": args.warm_start, "portfolios": len(inicial)} if inicial is not None else None,
+        "geracoes": len(resultado.log),
+        "geracao_parada": resultado.geracao_parada,
+        "segundos": resultado.segundos,
+        "cache_fitness": dict(resultado.estatisticas_cache),
+    }
+    with open(os.path.join(args.saida, "execucao.json"), "w", encoding="utf-8") as f:
+        json.dump(execucao, f, ensure_ascii=False, indent=2)
+
+    print(f"{len(pareto_df)} portfólios na fronteira de Pareto; resultados em {args.saida}/ "
+          f"({resultado.segundos:.2f} s, {len(resultado.log)} gerações)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Carga do histórico de taxas do Tesouro Direto com cache local em Parquet.
+
+O CSV é lido em blocos, descartando títulos vencidos e colunas sem uso, e o
+resultado fica gravado em disco (formato colunar, tipos compactos) junto com um
+arquivo de metadados. Nas próximas cargas a fonte só é baixada e
+reprocessada se tiver mudado: ETag/Last-Modified para URLs, data de modificação
+e tamanho para arquivos locais e, em último caso, o hash do conteúdo.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+URL_DADOS = "https://drive.usercontent.google.com/uc?id=1aYGWSsM0A2slQwfC-nwz-WR7e3-WnVXM&export=download"
+
+# A fonte pode ser trocada por um arquivo local ou servidor de teste (uso offline)
+FONTE_DADOS = os.environ.get("TESOURO_FONTE_DADOS", URL_DADOS)
+DIRETORIO_CACHE = os.environ.get(
+    "TESOURO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+
+# Únicas colunas do CSV usadas pelo app; as demais nem chegam a ser convertidas
+COLUNAS_CSV = ["Tipo Titulo", "Data Vencimento", "Data Base", "Taxa Compra Manha", "PU Base Manha"]
+TAMANHO_BLOCO = 100_000
+# Incrementar quando o conteúdo do frame processado mudar, invalidando caches antigos
+VERSAO_FORMATO = 3
+
+
+@dataclass
+class EstatisticasIngestao:
+    linhas_lidas: int = 0
+    linhas_mantidas: int = 0
+    segundos: float = 0.0
+    pico_memoria_bytes: int = 0  # alocações da ingestão (tracemalloc), só com medir_memoria=True
+    pico_rss_bytes: int = None  # maior crescimento da RSS do processo durante a ingestão, amostrada por bloco
+
+    @property
+    def linhas_por_segundo(self):
+        return self.linhas_lidas / self.segundos if self.segundos else 0.0
+
+    def como_dict(self):
+        return dict(asdict(self), linhas_por_segundo=self.linhas_por_segundo)
+
+
+def _estimar_linhas(caminho):
+    """Estimativa do número de linhas pelo tamanho do arquivo e de uma amostra do início"""
+    with open(caminho, "rb") as f:
+        amostra = f.read(1 << 16)
+    if not amostra:
+        return 0
+    bytes_por_linha = len(amostra) / max(1, amostra.count(b"\n"))
+    return int(os.path.getsize(caminho) / bytes_por_linha) + 1
+
+
+def _rss_atual():
+    """Memória residente atual do processo, em bytes (None fora do Linux)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def processar_csv(caminho, data_referencia=None, tamanho_bloco=TAMANHO_BLOCO, medir_memoria=False):
+    """Lê o CSV do Tesouro em blocos, já descartando títulos vencidos e colunas sem uso.
+
+    Cada bloco é lido só com as colunas necessárias, taxa em float32 com decimal
+    ',' e datas com formato fixo; as linhas mantidas são copiadas para arrays
+    colunares pré-alocados pela estimativa de linhas do arquivo. Retorna
+    (df, EstatisticasIngestao).
+
+    `medir_memoria=True` mede as alocações da ingestão com tracemalloc, que
+    deixa a leitura várias vezes mais lenta. Sempre (onde houver
+    /proc/self/statm) a RSS atual é lida antes e depois de cada bloco; o
+    maior crescimento em relação ao início vai em `pico_rss_bytes`.
+    """
+    medir_memoria = medir_memoria and not tracemalloc.is_tracing()
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    estatisticas = EstatisticasIngestao()
+    rss_inicial = _rss_atual()
+    rss_maxima = rss_inicial
+
+    capacidade = _estimar_linhas(caminho)
+    colunas = {
+        "Tipo Titulo": np.empty(capacidade, dtype=np.int16),
+        "Data Vencimento": np.empty(capacidade, dtype="datetime64[s]"),
+        "Data Base": np.empty(capacidade, dtype="datetime64[s]"),
+        "Rentabilidade": np.empty(capacidade, dtype=np.float32),
+        # PU em float64: os retornos diários são diferenças pequenas entre preços na casa dos milhares
+        "PU": np.empty(capacidade, dtype=np.float64),
+    }
+    categorias = {}
+    n = 0
+    try:
+        leitor = pd.read_csv(
+            caminho, sep=";", decimal=",", encoding="utf-8", usecols=COLUNAS_CSV,
+            dtype={"Tipo Titulo": str, "Data Vencimento": str, "Data Base": str, "Taxa Compra Manha": np.float32,
+                   "PU Base Manha": np.float64},
+            chunksize=tamanho_bloco,
+        )
+        with leitor:
+            for bloco in leitor:
+                if rss_inicial is not None:
+                    rss_maxima = max(rss_maxima, _rss_atual())
+                estatisticas.linhas_lidas += len(bloco)
+                vencimento = pd.to_datetime(bloco["Data Vencimento"], format="%d/%m/%Y", errors="coerce")
+                manter = vencimento.notna().to_numpy()
+                if data_referencia is not None:
+                    manter = manter & (vencimento > data_referencia).to_numpy()
+                k = int(manter.sum())
+                if k == 0:
+                    continue
+                if n + k > capacidade:
+                    capacidade = max(2 * capacidade, n + k)
+                    for nome, array in colunas.items():
+                        colunas[nome] = np.resize(array, capacidade)
+
+                codigos, valores = pd.factorize(bloco["Tipo Titulo"].to_numpy()[manter])
+                mapa = np.array([categorias.setdefault(v, len(categorias)) for v in valores], dtype=np.int16)
+                colunas["Tipo Titulo"][n:n + k] = np.where(codigos >= 0, mapa[codigos] if len(mapa) else -1, -1)
+                colunas["Data Vencimento"][n:n + k] = vencimento.to_numpy()[manter]
+                colunas["Data Base"][n:n + k] = pd.to_datetime(
+                    bloco["Data Base"].to_numpy()[manter], format="%d/%m/%Y", errors="coerce"
+                )
+                colunas["Rentabilidade"][n:n + k] = bloco["Taxa Compra Manha"].to_numpy()[manter]
+                colunas["PU"][n:n + k] = bloco["PU Base Manha"].to_numpy()[manter]
+                n += k
+
+        df = pd.DataFrame({
+            "Tipo Titulo": pd.Categorical.from_codes(colunas["Tipo Titulo"][:n], categories=list(categorias)),
+            "Data Vencimento": colunas["Data Vencimento"][:n],
+            "Data Base": colunas["Data Base"][:n],
+            "Rentabilidade": colunas["Rentabilidade"][:n],
+            "PU": colunas["PU"][:n],
+        })
+        df["Prazo"] = ((df["Data Vencimento"] - df["Data Base"]) / pd.Timedelta(days=1)).astype(np.float32)
+    finally:
+        if medir_memoria:
+            estatisticas.pico_memoria_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    if rss_inicial is not None:
+        estatisticas.pico_rss_bytes = max(rss_maxima, _rss_atual()) - rss_inicial
+    estatisticas.linhas_mantidas = n
+    estatisticas.segundos = time.perf_counter() - inicio
+    return df, estatisticas
+
+
+@dataclass
+class ModeloRisco:
+    """Covariância anualizada, em (% a.a.)², dos retornos diários do PU de cada título"""
+    chaves: list
+    covariancia: np.ndarray
+
+    def submatriz(self, chaves):
+        """Covariância na ordem de `chaves`; títulos sem histórico ficam com a maior variância e correlação 0"""
+        if not self.chaves:
+            raise ValueError("O histórico não tem cotações suficientes para estimar a covariância. Use o desvio padrão das taxas.")
+        posicao = {chave: i for i, chave in enumerate(self.chaves)}
+        indices = np.array([posicao.get(chave, -1) for chave in chaves], dtype=np.intp)
+        conhecidos = indices >= 0
+        variancia_maxima = float(np.diag(self.covariancia).max())
+        covariancia = np.diag(np.full(len(chaves), variancia_maxima))
+        covariancia[np.ix_(conhecidos, conhecidos)] = self.covariancia[np.ix_(indices[conhecidos], indices[conhecidos])]
+        return covariancia
+
+
+def modelo_risco(df, dias_por_ano=252, min_observacoes=20):
+    """Séries de retornos diários (log do PU) por título e a covariância entre elas.
+
+    Os retornos de cada título são calculados entre as suas próprias datas base
+    consecutivas e alinhados por data; a covariância usa os pares de datas em
+    comum (pelo menos `min_observacoes`). Pares sem dados em comum têm
+    covariância 0; títulos com menos observações recebem a maior variância
+    estimada, para não parecerem seguros por falta de histórico.
+    """
+    linhas = df.loc[df["PU"] > 0, ["Tipo Titulo", "Data Vencimento", "Data Base", "PU"]]
+    linhas = linhas.sort_values(["Tipo Titulo", "Data Vencimento", "Data Base"], kind="stable")
+    linhas = linhas.drop_duplicates(["Tipo Titulo", "Data Vencimento", "Data Base"], keep="last")
+    titulo = linhas.groupby(["Tipo Titulo", "Data Vencimento"], observed=True, sort=False).ngroup().to_numpy()
+    retorno = np.diff(np.log(linhas["PU"].to_numpy(dtype=np.float64)), prepend=np.nan) * 100
+    retorno[np.r_[True, titulo[1:] != titulo[:-1]]] = np.nan  # primeira cotação de cada título
+
+    series = pd.DataFrame({"Data Base": linhas["Data Base"].to_numpy(), "titulo": titulo, "retorno": retorno})
+    series = series.dropna().pivot(index="Data Base", columns="titulo", values="retorno")
+    covariancia = series.cov(min_periods=min_observacoes).to_numpy() * dias_por_ano
+
+    primeiras = linhas.drop_duplicates(["Tipo Titulo", "Data Vencimento"])
+    chaves_titulos = [chave_titulo(t, v) for t, v in zip(primeiras["Tipo Titulo"], primeiras["Data Vencimento"])]
+    chaves = [chaves_titulos[i] for i in series.columns]
+    variancia = np.diag(covariancia).copy()
+    sem_historico = np.isnan(variancia)
+    if sem_historico.all():
+        return ModeloRisco([], np.zeros((0, 0)))
+    variancia[sem_historico] = np.nanmax(variancia)
+    covariancia = np.nan_to_num(covariancia, nan=0.0)
+    np.fill_diagonal(covariancia, variancia)
+    return ModeloRisco(chaves, covariancia)
+
+
+@dataclass
+class Universo:
+    """Títulos candidatos do GA: uma linha por título, com a cotação mais recente"""
+    df: pd.DataFrame
+    chaves: list
+    indice_por_chave: dict
+    covariancia: np.ndarray = None  # de ModeloRisco.submatriz, quando há modelo de risco
+
+    @property
+    def versao(self):
+        """Hash dos títulos e das rentabilidades: muda quando o universo muda"""
+        sha = hashlib.sha1(json.dumps(self.chaves).encode("utf-8"))
+        sha.update(memoryview(np.ascontiguousarray(self.df["Rentabilidade"].to_numpy(dtype=np.float64))))
+        if self.covariancia is not None:
+            sha.update(memoryview(np.ascontiguousarray(self.covariancia)))  # sem copiar a matriz
+        return sha.hexdigest()[:16]
+
+
+def chave_titulo(tipo, vencimento):
+    """Identifica um título de forma estável entre recargas do dataset"""
+    return (str(tipo), pd.Timestamp(vencimento).strftime("%Y-%m-%d"))
+
+
+def remapear_portfolios(portfolios, universo):
+    """Converte portfólios descritos por chaves de título em índices do universo atual.
+
+    Títulos que saíram do universo são descartados (e portfólios que ficarem
+    vazios também); o GA completa o que faltar. Portfólios que, depois do
+    remapeamento, têm os mesmos títulos (em qualquer ordem) entram uma vez só.
+    """
+    unicos = {}
+    for p in portfolios:
+        indices = list(dict.fromkeys(universo.indice_por_chave[c] for c in p if c in universo.indice_por_chave))
+        if indices:
+            unicos.setdefault(tuple(sorted(indices)), indices)
+    return list(unicos.values())
+
+
+def construir_universo(df, podar=False, n_ativos=None, risco=None):
+    """Mantém a última cotação de cada (Tipo Titulo, Data Vencimento).
+
+    Com `podar=True`, títulos do mesmo tipo e mesma rentabilidade são
+    intercambiáveis nos três objetivos; basta manter `n_ativos` de cada grupo
+    para que qualquer vetor de objetivos alcançável continue alcançável. Isso
+    não vale com a covariância, então `risco` (um ModeloRisco) não pode ser
+    combinado com a poda.
+    """
+    if podar and risco is not None:
+        raise ValueError("A poda do universo não vale com o risco por covariância")
+    ultimas = (
+        df.sort_values("Data Base", kind="stable", na_position="first")
+        .drop_duplicates(["Tipo Titulo", "Data Vencimento"], keep="last")
+        .sort_values(["Tipo Titulo", "Data Vencimento"], kind="stable")
+    )
+    if podar and n_ativos:
+        ordem_no_grupo = ultimas.groupby(["Tipo Titulo", "Rentabilidade"], observed=True, dropna=False).cumcount()
+        ultimas = ultimas[ordem_no_grupo < n_ativos]
+    ultimas = ultimas.reset_index(drop=True)
+    chaves = [chave_titulo(t, v) for t, v in zip(ultimas["Tipo Titulo"], ultimas["Data Vencimento"])]
+    covariancia = risco.submatriz(chaves) if risco is not None else None
+    return Universo(ultimas, chaves, {chave: i for i, chave in enumerate(chaves)}, covariancia)
+
+
+def _eh_url(fonte):
+    return urlparse(fonte).scheme in ("http", "https")
+
+
+def _caminho_local(fonte):
+    partes = urlparse(fonte)
+    return partes.path if partes.scheme == "file" else fonte
+
+
+def _caminhos_cache(fonte, diretorio_cache):
+    chave = hashlib.sha1(fonte.encode("utf-8")).hexdigest()[:12]
+    base = os.path.join(diretorio_cache, f"tesouro_{chave}")
+    return base + ".parquet", base + ".json"
+
+
+def _ler_metadados(caminho_parquet, caminho_meta):
+    if not (os.path.exists(caminho_parquet) and os.path.exists(caminho_meta)):
+        return {}
+    with open(caminho_meta, encoding="utf-8") as f:
+        meta = json.load(f)
+    return meta if meta.get("formato") == VERSAO_FORMATO else {}
+
+
+def _gravar_atomico(caminho, escrever):
+    """Grava num temporário do mesmo diretório e troca de nome no final"""
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+    os.close(fd)
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _gravar_metadados(caminho_meta, meta):
+    def escrever(caminho):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(caminho_meta, escrever)
+
+
+def _baixar_condicional(url, meta, diretorio, timeout):
+    """Baixa a URL para um temporário, ou devolve None se o servidor responder 304"""
+    cabecalhos = {}
+    if meta.get("etag"):
+        cabecalhos["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        cabecalhos["If-Modified-Since"] = meta["last_modified"]
+    with requests.get(url, headers=cabecalhos, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        sha = hashlib.sha256()
+        fd, caminho = tempfile.mkstemp(dir=diretorio, suffix=".csv")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for bloco in r.iter_content(1 << 20):
+                    sha.update(bloco)
+                    f.write(bloco)
+        except BaseException:
+            # Download interrompido: não deixa o arquivo parcial no diretório do cache
+            os.remove(caminho)
+            raise
+        origem = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    return caminho, sha.hexdigest(), origem
+
+
+def _verificar_arquivo(caminho, meta):
+    """Devolve None se o arquivo local não mudou desde a última carga"""
+    info = os.stat(caminho)
+    origem = {"mtime_ns": info.st_mtime_ns, "tamanho": info.st_size}
+    if all(meta.get(chave) == valor for chave, valor in origem.items()):
+        return None
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloco)
+    return caminho, sha.hexdigest(), origem
+
+
+def carregar_base(fonte=None, diretorio_cache=None, timeout=30):
+    """Carrega o dataset processado, reaproveitando o cache em disco quando a fonte não mudou.
+
+    Retorna (df, metadados). `metadados["origem"]` indica se o frame veio do
+    cache ("cache") ou foi reprocessado ("fonte"). Se a fonte estiver
+    inacessível e houver cache, ele é usado e o erro vai em `metadados["aviso"]`.
+    """
+    fonte = fonte or FONTE_DADOS
+    diretorio_cache = diretorio_cache or DIRETORIO_CACHE
+    os.makedirs(diretorio_cache, exist_ok=True)
+    caminho_parquet, caminho_meta = _caminhos_cache(fonte, diretorio_cache)
+    meta = _ler_metadados(caminho_parquet, caminho_meta)
+
+    try:
+        if _eh_url(fonte):
+            novo = _baixar_condicional(fonte, meta, diretorio_cache, timeout)
+        else:
+            novo = _verificar_arquivo(_caminho_local(fonte), meta)
+    except (requests.RequestException, OSError) as e:
+        if not meta:
+            raise
+        return pd.read_parquet(caminho_parquet), dict(meta, origem="cache", aviso=str(e))
+
+    if novo is None:
+        return pd.read_parquet(caminho_parquet), dict(meta, origem="cache")
+
+    caminho, sha, origem = novo
+    try:
+        if meta.get("sha256") == sha:
+            # Conteúdo idêntico (servidor sem ETag ou arquivo apenas tocado): só renova os metadados
+            meta.update(origem)
+            _gravar_metadados(caminho_meta, meta)
+            return pd.read_parquet(caminho_parquet), dict(meta, origem="cache")
+        # Títulos já vencidos no momento da carga nunca voltam a ser usados
+        df, estatisticas = processar_csv(caminho, data_referencia=pd.Timestamp.now())
+    finally:
+        if caminho != _caminho_local(fonte):
+            os.remove(caminho)
+
+    _gravar_atomico(caminho_parquet, lambda destino: df.to_parquet(destino, index=False))
+    meta = {"formato": VERSAO_FORMATO, "fonte": fonte, "sha256": sha, "linhas": len(df), "ingestao": estatisticas.como_dict(), **origem}
+    _gravar_metadados(caminho_meta, meta)
+    return df, dict(meta, origem="fonte")
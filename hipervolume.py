@@ -0,0 +1,58 @@
+"""Hipervolume da população nos três objetivos (retorno, risco, diversidade).
+
+O volume dominado em relação a um ponto de referência fixo mede a fronteira
+inteira, não só o melhor retorno. Como a diversidade só assume poucos valores,
+o volume 3D é a soma, nível a nível da diversidade, da área 2D (retorno x
+risco) dos pontos com diversidade maior ou igual ao nível, obtida numa
+varredura da "escada" de pontos não-dominados: O(níveis x n) por população.
+"""
+import numpy as np
+
+
+def referencia_para(problema, n_ativos):
+    """Ponto de referência (retorno, risco, diversidade) pior que qualquer portfólio do problema.
+
+    Retorno: a menor rentabilidade do universo. Risco: o maior desvio padrão
+    amostral possível de n_ativos valores entre a menor e a maior rentabilidade
+    (ou 0.1, o risco mínimo atribuído pela avaliação); com covariância, a maior
+    volatilidade de um título, que limita a de qualquer carteira com pesos
+    iguais. Diversidade: 0.
+    """
+    minimo, maximo = np.nanmin(problema.rentabilidade), np.nanmax(problema.rentabilidade)
+    if problema.covariancia is not None:
+        risco_maximo = np.sqrt(np.diag(problema.covariancia).max(initial=0.0))
+    else:
+        risco_maximo = (maximo - minimo) / 2 * np.sqrt(n_ativos / max(1, n_ativos - 1))
+    return (float(minimo), float(max(risco_maximo, 0.1)), 0.0)
+
+
+class Hipervolume:
+    """Calcula o hipervolume de populações em relação a um ponto de referência fixo"""
+
+    def __init__(self, referencia):
+        self.referencia = tuple(referencia)
+
+    def __call__(self, fits):
+        r0, s0, d0 = self.referencia
+        fits = np.asarray(fits, dtype=np.float64).reshape(-1, 3)
+        dentro = ~np.isnan(fits).any(axis=1) & (fits[:, 0] > r0) & (fits[:, 1] < s0) & (fits[:, 2] > d0)
+        fits = fits[dentro]
+        if len(fits) == 0:
+            return 0.0
+        # Retorno decrescente (empate: menor risco primeiro) para varrer a escada
+        retorno, risco, diversidade = fits[np.lexsort((fits[:, 1], -fits[:, 0]))].T
+
+        volume = 0.0
+        anterior = d0
+        for nivel in np.unique(diversidade):
+            volume += (nivel - anterior) * self._area(retorno[diversidade >= nivel], risco[diversidade >= nivel])
+            anterior = nivel
+        return volume
+
+    def _area(self, retorno, risco):
+        r0, s0, _ = self.referencia
+        menor_anterior = np.minimum.accumulate(np.concatenate(([s0], risco)))[:-1]
+        degrau = risco < menor_anterior
+        retorno, risco = retorno[degrau], risco[degrau]
+        topo = np.concatenate(([s0], risco[:-1]))
+        return float(((retorno - r0) * (topo - risco)).sum())
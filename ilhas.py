@@ -0,0 +1,160 @@
+"""NSGA-II em modelo de ilhas: K subpopulações evoluindo em processos separados.
+
+Cada ilha é um processo com uma `motor.PopulacaoMatriz` própria, com uma
+fatia da população: o total continua `config.pop_size`. As colunas do
+problema (e a matriz de covariância, se houver) são publicadas uma única vez
+em memória compartilhada, em vez de serem serializadas para cada processo. A cada `intervalo_migracao` gerações o
+coordenador recolhe o log das ilhas (repassado ao callback de progresso) e
+envia a cada ilha os melhores indivíduos da vizinha (topologia em anel).
+
+Iniciar um processo com spawn custa um interpretador novo importando NumPy,
+pandas e DEAP (cerca de meio segundo cada); execuções pequenas rodam num
+processo só (ver `n_ilhas_efetivas`).
+"""
+import multiprocessing as mp
+import os
+from collections import Counter
+from dataclasses import replace
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import motor
+import perfil as medicao
+
+MIN_POR_ILHA = 50  # indivíduos por ilha
+AVALIACOES_POR_ILHA = 100_000  # pop_size x ngen que compensa o spawn de mais uma ilha
+
+
+def n_ilhas_efetivas(config):
+    """Ilhas realmente usadas: no máximo `config.n_ilhas` e o número de núcleos, com pelo
+    menos MIN_POR_ILHA indivíduos e AVALIACOES_POR_ILHA avaliações por ilha (1: sem processos)"""
+    return max(1, min(config.n_ilhas, os.cpu_count() or 1, config.pop_size // MIN_POR_ILHA,
+                      config.pop_size * config.ngen // AVALIACOES_POR_ILHA))
+
+
+def tamanhos_ilhas(pop_size, n_ilhas):
+    """Divide pop_size entre as ilhas; o resto vai para as primeiras"""
+    base, resto = divmod(pop_size, n_ilhas)
+    return [base + (ilha < resto) for ilha in range(n_ilhas)]
+
+
+def _compartilhar(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _anexar(descritor):
+    nome, forma, dtype = descritor
+    shm = shared_memory.SharedMemory(name=nome)
+    return shm, np.ndarray(forma, np.dtype(dtype), buffer=shm.buf)
+
+
+def _processo_ilha(ilha, tamanho, descritores, config, inicial, medir, conexao):
+    """Laço de uma ilha: evolui sob comando do coordenador e troca migrantes"""
+    memorias, colunas = zip(*(_anexar(d) for d in descritores))
+    problema = motor.Problema(*colunas)
+    estatisticas_cache = Counter()
+    # Cada ilha tem a sua fatia da população; os migrantes não passam de metade dela
+    config = replace(config, pop_size=tamanho, n_migrantes=min(config.n_migrantes, tamanho // 2))
+    perfil = medicao.Perfil() if medir else medicao.NULO
+    populacao = motor.PopulacaoMatriz(
+        problema, config, np.random.default_rng([config.semente, ilha]), estatisticas_cache, inicial, perfil
+    )
+    try:
+        while True:
+            comando, *argumentos = conexao.recv()
+            if comando == "evoluir":
+                inicio, n_geracoes, imigrantes = argumentos
+                if imigrantes is not None:
+                    populacao.receber(*imigrantes)
+                log = [(g, *populacao.geracao(g)) for g in range(inicio, inicio + n_geracoes)]
+                conexao.send((log, populacao.emigrantes(config.n_migrantes)))
+            elif comando == "finalizar":
+                eventos = (perfil.eventos, dict(perfil.contagens)) if medir else None
+                conexao.send((populacao.pop, populacao.fits, estatisticas_cache, eventos))
+                return
+    finally:
+        del populacao, problema, colunas
+        for shm in memorias:
+            shm.close()
+
+
+def rodar_ilhas(problema, config, progresso, inicial=None, perfil=medicao.NULO):
+    """Executa o NSGA-II em `n_ilhas_efetivas(config)` processos e devolve um motor.ResultadoOtimizacao.
+
+    A população final é a união das ilhas (`config.pop_size` indivíduos); o
+    log por geração traz o melhor score entre as ilhas, a média das médias e o
+    maior hipervolume de uma ilha. Os portfólios de `inicial` (warm start) são
+    repartidos entre as ilhas. Com `perfil` ativo, cada ilha mede as próprias
+    fases e os eventos são reunidos numa trilha por ilha.
+    """
+    n_ilhas = n_ilhas_efetivas(config)
+    tamanhos = tamanhos_ilhas(config.pop_size, n_ilhas)
+    contexto = mp.get_context("spawn")
+    colunas = (problema.rentabilidade, problema.tipo_codigos)
+    if problema.covariancia is not None:
+        colunas += (problema.covariancia,)
+    memorias, descritores = zip(*(_compartilhar(c) for c in colunas))
+    conexoes, processos = [], []
+    try:
+        for ilha, tamanho in enumerate(tamanhos):
+            sementes = inicial[ilha::n_ilhas] if inicial else inicial
+            local, remota = contexto.Pipe()
+            processo = contexto.Process(
+                target=_processo_ilha, args=(ilha, tamanho, descritores, config, sementes, perfil.ativo, remota),
+                daemon=True,
+            )
+            processo.start()
+            remota.close()
+            conexoes.append(local)
+            processos.append(processo)
+
+        log = []
+        parada = motor.CriterioParada(config)
+        geracao_parada = None
+        imigrantes = [None] * n_ilhas
+        g = 1
+        while g <= config.ngen and geracao_parada is None:
+            n_geracoes = min(config.intervalo_migracao, config.ngen - g + 1)
+            for conexao, recebidos in zip(conexoes, imigrantes):
+                conexao.send(("evoluir", g, n_geracoes, recebidos))
+            respostas = [conexao.recv() for conexao in conexoes]
+
+            for passo in zip(*(log_ilha for log_ilha, _ in respostas)):
+                geracao = passo[0][0]
+                melhor = max(melhor for _, melhor, _, _ in passo)
+                volume = max(volume for _, _, _, volume in passo)
+                log.append((geracao, melhor, float(np.mean([media for _, _, media, _ in passo])), volume))
+                with perfil.fase(geracao, "renderização"):
+                    progresso(geracao, log)
+                if parada.atualizar(melhor, volume) and geracao_parada is None:
+                    geracao_parada = g + n_geracoes - 1  # as ilhas só param no fim da época
+
+            # Migração em anel: a ilha i recebe os melhores da ilha i - 1
+            emigrantes = [emigrantes for _, emigrantes in respostas]
+            imigrantes = emigrantes[-1:] + emigrantes[:-1]
+            g += n_geracoes
+
+        pops, fits, estatisticas_cache = [], [], Counter()
+        for ilha, conexao in enumerate(conexoes):
+            conexao.send(("finalizar",))
+            pop, fit, estatisticas, eventos = conexao.recv()
+            pops.append(pop)
+            fits.append(fit)
+            estatisticas_cache.update(estatisticas)
+            if eventos is not None:
+                perfil.incorporar(*eventos, trilha=ilha + 1)
+        for processo in processos:
+            processo.join()
+    finally:
+        for processo in processos:
+            if processo.is_alive():
+                processo.terminate()
+        for shm in memorias:
+            shm.close()
+            shm.unlink()
+
+    populacao = motor.matriz_para_individuos(np.concatenate(pops), np.concatenate(fits))
+    return motor.ResultadoOtimizacao(populacao, log, estatisticas_cache, geracao_parada=geracao_parada)
@@ -0,0 +1,736 @@
+"""Motor do algoritmo genético multiobjetivo (NSGA-II), independente da interface.
+
+Todo o estado de uma execução vem de um `Problema` (colunas do universo de
+títulos) e de uma `ConfiguracaoGA`; o progresso é informado por callback. Assim
+o mesmo código roda no Streamlit, na linha de comando (cli.py) e em benchmarks.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import warnings
+from collections import Counter, OrderedDict
+from dataclasses import asdict, dataclass, field
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from deap import base, creator, tools
+
+import hipervolume
+import nsga2
+from perfil import NULO as SEM_PERFIL
+
+# Retorno (max), Risco (min), Diversidade (max)
+if not hasattr(creator, "FitnessMulti"):
+    creator.create("FitnessMulti", base.Fitness, weights=(1.0, -1.0, 1.0))
+    creator.create("Individual", list, fitness=creator.FitnessMulti)  # type: ignore
+
+MOTORES = ("deap", "numpy")
+PARADAS = ("hipervolume", "retorno")
+RISCOS = ("desvio", "covariancia")
+
+
+@dataclass
+class ConfiguracaoGA:
+    pop_size: int = 100
+    ngen: int = 100
+    cxpb: float = 0.7
+    mutpb: float = 0.9
+    n_ativos: int = 5
+    elite_size: int = 10  # percentual da população
+    tournament_size: int = 4
+    diversity_threshold: float = 0.3
+    motor: str = "deap"
+    semente: int = 42
+    early_stop_limit: int = 20
+    parada: str = "hipervolume"  # "retorno": early stopping só pelo melhor retorno
+    tolerancia_hipervolume: float = 0.001  # melhora relativa mínima do hipervolume
+    n_ilhas: int = 1  # > 1: modelo de ilhas em processos separados (motor NumPy)
+    intervalo_migracao: int = 10  # gerações entre migrações
+    n_migrantes: int = 5  # indivíduos enviados à ilha vizinha
+    risco: str = "desvio"  # "covariancia": volatilidade do portfólio pela covariância histórica do PU
+
+    def __post_init__(self):
+        if self.motor not in MOTORES:
+            raise ValueError(f"Motor desconhecido: {self.motor!r} (use um de {MOTORES})")
+        if self.parada not in PARADAS:
+            raise ValueError(f"Critério de parada desconhecido: {self.parada!r} (use um de {PARADAS})")
+        if self.risco not in RISCOS:
+            raise ValueError(f"Modelo de risco desconhecido: {self.risco!r} (use um de {RISCOS})")
+        if self.n_ilhas < 1 or self.intervalo_migracao < 1:
+            raise ValueError("n_ilhas e intervalo_migracao devem ser positivos")
+
+
+@dataclass
+class ResultadoOtimizacao:
+    populacao: list
+    log: list
+    estatisticas_cache: Counter = field(default_factory=Counter)
+    geracao_parada: int = None  # geração do early stopping, se houve
+    segundos: float = 0.0
+    perfil: object = SEM_PERFIL  # tempos por fase (perfil.Perfil), se medidos
+
+    @cached_property
+    def pareto(self):
+        return fronteira_pareto(self.populacao)
+
+
+def chave_execucao(config, versao_dados, inicial=None):
+    """Identifica uma execução: mesmos parâmetros, semente, dados e população inicial levam ao mesmo resultado"""
+    conteudo = json.dumps({"config": asdict(config), "dados": versao_dados, "inicial": inicial}, sort_keys=True)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+class CacheResultados:
+    """Cache LRU de ResultadoOtimizacao por chave_execucao, compartilhável entre sessões"""
+
+    def __init__(self, capacidade=16):
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            resultado = self._entradas.get(chave)
+            if resultado is not None:
+                self._entradas.move_to_end(chave)
+            return resultado
+
+    def guardar(self, chave, resultado):
+        with self._lock:
+            self._entradas[chave] = resultado
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+
+class CacheFitness:
+    """Cache LRU de objetivos indexado pelo portfólio ordenado.
+
+    Os objetivos não dependem da ordem dos títulos, então a tupla ordenada de
+    índices identifica o portfólio. Pode ser compartilhado entre execuções (e
+    sessões) enquanto a versão dos dados não mudar.
+    """
+
+    def __init__(self, capacidade=100_000):
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.totais = Counter()
+
+    def avaliar(self, matriz, avaliador, estatisticas=None):
+        """Devolve os objetivos de cada linha, avaliando em lote apenas os portfólios inéditos"""
+        chaves = list(map(tuple, np.sort(np.asarray(matriz), axis=1).tolist()))
+        resultados = [None] * len(chaves)
+        pendentes = {}
+        with self._lock:
+            for i, chave in enumerate(chaves):
+                fit = self._entradas.get(chave)
+                if fit is None:
+                    pendentes.setdefault(chave, []).append(i)
+                else:
+                    self._entradas.move_to_end(chave)
+                    resultados[i] = fit
+        contagem = Counter(hits=len(chaves) - len(pendentes), misses=len(pendentes))
+
+        if pendentes:
+            for (chave, posicoes), fit in zip(pendentes.items(), avaliador(list(pendentes))):
+                for i in posicoes:
+                    resultados[i] = fit
+                pendentes[chave] = fit
+            with self._lock:
+                self._entradas.update(pendentes)
+                while len(self._entradas) > self.capacidade:
+                    self._entradas.popitem(last=False)
+                    contagem["evictions"] += 1
+
+        with self._lock:
+            self.totais.update(contagem)
+        if estatisticas is not None:
+            estatisticas.update(contagem)
+        return resultados
+
+
+class Problema:
+    """Colunas do universo de títulos pré-computadas uma única vez para a avaliação vetorizada"""
+
+    def __init__(self, rentabilidade, tipo_codigos, covariancia=None, cache=None):
+        self.rentabilidade = np.asarray(rentabilidade, dtype=np.float64)
+        self.tipo_codigos = np.asarray(tipo_codigos, dtype=np.int32)  # -1 para valores ausentes
+        # Com covariância (n_titulos x n_titulos), o risco é a volatilidade do portfólio
+        self.covariancia = None if covariancia is None else np.ascontiguousarray(covariancia, dtype=np.float64)
+        # Versão dos dados usada para isolar caches entre recargas do dataset
+        # (os arrays vão direto para o hash, sem cópia; a covariância pode ter n_titulos²)
+        sha = hashlib.sha1()
+        for array in (self.rentabilidade, self.tipo_codigos, self.covariancia):
+            if array is not None:
+                sha.update(memoryview(np.ascontiguousarray(array)))
+        self.versao = sha.hexdigest()[:16]
+        self.cache = cache if cache is not None else CacheFitness()
+
+    @classmethod
+    def do_dataframe(cls, titulos_df, cache=None, covariancia=None):
+        return cls(
+            titulos_df["Rentabilidade"].to_numpy(dtype=np.float64),
+            pd.factorize(titulos_df["Tipo Titulo"])[0],
+            covariancia=covariancia,
+            cache=cache,
+        )
+
+    @property
+    def n_titulos(self):
+        return len(self.rentabilidade)
+
+
+# Funções auxiliares melhoradas
+def gerar_indices(n_titulos, n_ativos, rng):
+    """Gera índices únicos para representar um portfólio"""
+    return rng.sample(range(n_titulos), n_ativos)
+
+def repair(ind, n_titulos, n_ativos, rng):
+    """Repara indivíduo removendo duplicatas e garantindo tamanho correto"""
+    unique = list(dict.fromkeys(ind))
+    while len(unique) < n_ativos:
+        novo = rng.randint(0, n_titulos - 1)
+        if novo not in unique:
+            unique.append(novo)
+    return unique[:n_ativos]
+
+def _titulos_unicos(matriz):
+    """Achata os títulos de cada linha da matriz ignorando repetições dentro da linha"""
+    ordenada = np.sort(np.asarray(matriz, dtype=np.intp).reshape(len(matriz), -1), axis=1)
+    unicos = np.ones(ordenada.shape, dtype=bool)
+    unicos[:, 1:] = ordenada[:, 1:] != ordenada[:, :-1]
+    return ordenada[unicos]
+
+def calcular_diversidade(populacao, n_ativos):
+    """Calcula a diversidade da população baseada na distância média entre indivíduos
+
+    A sobreposição de cada par é o produto interno das linhas da matriz de
+    incidência população x título; a soma sobre todos os pares sai direto das
+    contagens por coluna: sum_{i<j} |Si & Sj| = (sum c_t^2 - sum c_t) / 2.
+    """
+    if len(populacao) < 2:
+        return 0.0
+    contagens = np.bincount(_titulos_unicos(populacao)).astype(np.int64)
+    pares = len(populacao) * (len(populacao) - 1) / 2
+    sobreposicao = (contagens @ contagens - contagens.sum()) / 2
+    return float(1 - sobreposicao / (n_ativos * pares))
+
+class DiversidadeIncremental:
+    """Mantém as contagens por título e atualiza a diversidade só com os indivíduos trocados"""
+
+    def __init__(self, n_titulos, n_ativos):
+        self.n_ativos = n_ativos
+        self._contagens = np.zeros(n_titulos, dtype=np.int64)
+        self._soma = 0
+        self._soma_quadrados = 0
+        self._n = 0
+        self._membros = {}  # id do indivíduo -> (indivíduo, títulos no momento da entrada)
+        self._ids = Counter()
+
+    def atualizar(self, removidos, adicionados):
+        """Retira e inclui linhas (portfólios) nas contagens por título"""
+        for linhas, sinal in ((removidos, -1), (adicionados, 1)):
+            if len(linhas) == 0:
+                continue
+            titulos, delta = np.unique(_titulos_unicos(linhas), return_counts=True)
+            antes = self._contagens[titulos]
+            depois = antes + sinal * delta
+            self._soma_quadrados += int((depois @ depois) - (antes @ antes))
+            self._soma += sinal * int(delta.sum())
+            self._contagens[titulos] = depois
+            self._n += sinal * len(linhas)
+        return self.valor
+
+    def sincronizar(self, populacao):
+        """Compara por identidade com a população anterior (listas DEAP) e aplica só a diferença"""
+        atuais = Counter(map(id, populacao))
+        novos = {id(ind): ind for ind in populacao}
+        removidos = []
+        for chave, qtd in (self._ids - atuais).items():
+            removidos.extend([self._membros[chave][1]] * qtd)
+        adicionados = []
+        for chave, qtd in (atuais - self._ids).items():
+            self._membros.setdefault(chave, (novos[chave], tuple(novos[chave])))
+            adicionados.extend([self._membros[chave][1]] * qtd)
+        self._ids = atuais
+        self._membros = {chave: self._membros[chave] for chave in atuais}
+        return self.atualizar(removidos, adicionados)
+
+    @property
+    def valor(self):
+        if self._n < 2:
+            return 0.0
+        pares = self._n * (self._n - 1) / 2
+        return float(1 - (self._soma_quadrados - self._soma) / 2 / (self.n_ativos * pares))
+
+# Operadores genéticos melhorados
+def crossover_uniforme(ind1, ind2, n_titulos, n_ativos, rng):
+    """Crossover uniforme melhorado para portfólios"""
+    child1 = []
+    child2 = []
+
+    # Usar máscara aleatória para decidir de qual pai pegar cada posição
+    mask = [rng.random() < 0.5 for _ in range(n_ativos)]
+
+    for i in range(n_ativos):
+        if mask[i]:
+            child1.append(ind1[i])
+            child2.append(ind2[i])
+        else:
+            child1.append(ind2[i])
+            child2.append(ind1[i])
+
+    # Reparar duplicatas
+    child1 = repair(child1, n_titulos, n_ativos, rng)
+    child2 = repair(child2, n_titulos, n_ativos, rng)
+
+    return creator.Individual(child1), creator.Individual(child2)  # type: ignore
+
+def mutacao_inteligente(ind, n_titulos, n_ativos, rng, indpb=0.3):
+    """Mutação inteligente que preserva alguns títulos bons"""
+    if rng.random() < indpb:
+        ind_copy = list(ind)
+
+        # Mutação por substituição parcial
+        num_mutations = max(1, int(n_ativos * 0.3))  # 30% dos títulos
+        positions = rng.sample(range(n_ativos), num_mutations)
+
+        for pos in positions:
+            # Substituir por um título aleatório
+            novo_titulo = rng.randint(0, n_titulos - 1)
+            while novo_titulo in ind_copy:
+                novo_titulo = rng.randint(0, n_titulos - 1)
+            ind_copy[pos] = novo_titulo
+
+        return creator.Individual(ind_copy),  # type: ignore
+    return ind,
+
+def mutacao_swap(ind, n_ativos, rng, indpb=0.2):
+    """Mutação por troca de posições"""
+    if rng.random() < indpb:
+        ind_copy = list(ind)
+        # Trocar duas posições aleatórias
+        pos1, pos2 = rng.sample(range(n_ativos), 2)
+        ind_copy[pos1], ind_copy[pos2] = ind_copy[pos2], ind_copy[pos1]
+        return creator.Individual(ind_copy),  # type: ignore
+    return ind,
+
+# Função de avaliação adaptada para NSGA-II
+def evaluate_lote(problema, matriz):
+    """Avalia vários portfólios de uma vez a partir de uma matriz (P, n_ativos) de índices.
+
+    Reproduz a semântica do pandas: média e desvio padrão amostral ignorando
+    NaN, risco 0 substituído por 0.1 e contagem de tipos distintos sem NaN.
+    Com `problema.covariancia`, o risco é sqrt(w' Σ w) com pesos iguais nos
+    títulos válidos, calculado em lote sobre as submatrizes (P, n_ativos, n_ativos).
+    """
+    if len(matriz) == 0:
+        return []
+    matriz = np.asarray(matriz, dtype=np.intp)
+    rent = problema.rentabilidade[matriz]
+    validos = ~np.isnan(rent)
+    n_validos = validos.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        retorno = np.where(validos, rent, 0.0).sum(axis=1) / n_validos
+        if problema.covariancia is None:
+            desvios = np.where(validos, rent - retorno[:, None], 0.0)
+            risco = np.sqrt((desvios ** 2).sum(axis=1) / (n_validos - 1))
+            risco[n_validos <= 1] = np.nan
+        else:
+            pesos = validos / n_validos[:, None]
+            sub = problema.covariancia[matriz[:, :, None], matriz[:, None, :]]
+            # max(0, ...): a covariância por pares de datas em comum pode não ser semidefinida
+            risco = np.sqrt(np.maximum(np.einsum("pi,pij,pj->p", pesos, sub, pesos), 0.0))
+            risco[n_validos == 0] = np.nan
+    risco[risco == 0] = 0.1
+
+    # Tipos distintos: ordenar os códigos e contar as trocas de valor
+    codigos = np.sort(problema.tipo_codigos[matriz], axis=1)
+    diversidade = (codigos[:, 1:] != codigos[:, :-1]).sum(axis=1) + 1
+    diversidade -= codigos[:, 0] == -1
+    return list(zip(retorno.tolist(), risco.tolist(), diversidade.tolist()))
+
+def evaluate(ind, problema):
+    try:
+        # Sempre retornar os três objetivos para NSGA-II
+        return evaluate_lote(problema, [ind])[0]
+    except Exception as e:
+        warnings.warn(f"Erro na avaliação: {e}")
+        return (0.0, 0.1, 1.0)
+
+def avaliar_com_cache(problema, matriz, estatisticas):
+    return problema.cache.avaliar(matriz, lambda linhas: evaluate_lote(problema, linhas), estatisticas)
+
+def criar_toolbox(problema, config, rng, map_func=map):
+    """Registra operadores e avaliação já ligados ao problema, à configuração e ao gerador da execução"""
+    n_titulos, n_ativos = problema.n_titulos, config.n_ativos
+    toolbox = base.Toolbox()
+    toolbox.register("indices", gerar_indices, n_titulos, n_ativos, rng)
+    toolbox.register("individual", tools.initIterate, creator.Individual, toolbox.indices)  # type: ignore
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)  # type: ignore
+    toolbox.register("repair", repair, n_titulos=n_titulos, n_ativos=n_ativos, rng=rng)
+    toolbox.register("mate", crossover_uniforme, n_titulos=n_titulos, n_ativos=n_ativos, rng=rng)
+    toolbox.register("mutate", mutacao_inteligente, n_titulos=n_titulos, n_ativos=n_ativos, rng=rng)
+    toolbox.register("mutate_swap", mutacao_swap, n_ativos=n_ativos, rng=rng)
+    toolbox.register("evaluate", evaluate, problema=problema)
+    toolbox.register("select", nsga2.selNSGA2)
+    toolbox.register("map", map_func)
+    return toolbox
+
+def variar(populacao, toolbox, cxpb, mutpb, rng):
+    """Mesmo esquema do algorithms.varAnd, mas sorteando com o gerador da execução"""
+    offspring = [toolbox.clone(ind) for ind in populacao]
+    for i in range(1, len(offspring), 2):
+        if rng.random() < cxpb:
+            offspring[i - 1], offspring[i] = toolbox.mate(offspring[i - 1], offspring[i])
+            del offspring[i - 1].fitness.values, offspring[i].fitness.values
+    for i in range(len(offspring)):
+        if rng.random() < mutpb:
+            offspring[i], = toolbox.mutate(offspring[i])
+            del offspring[i].fitness.values
+    return offspring
+
+# Operadores em lote para o motor NumPy (população como matriz P x n_ativos)
+def reparar_lote(matriz, n_titulos, rng):
+    """Substitui títulos repetidos em cada linha, mantendo a primeira ocorrência"""
+    iguais = matriz[:, :, None] == matriz[:, None, :]
+    repetido = np.tril(iguais, k=-1).any(axis=2)  # igual a alguma posição anterior
+    while repetido.any():
+        matriz[repetido] = rng.integers(0, n_titulos, int(repetido.sum()))
+        # Só as posições sorteadas podem colidir; as originais já são únicas entre si
+        repetido &= (matriz[:, :, None] == matriz[:, None, :]).sum(axis=2) > 1
+    return matriz
+
+def gerar_populacao_lote(n, n_titulos, n_ativos, rng):
+    """Gera n portfólios aleatórios sem títulos repetidos"""
+    return reparar_lote(rng.integers(0, n_titulos, (n, n_ativos)), n_titulos, rng)
+
+def semear_lote(matriz, inicial, n_titulos, rng):
+    """Copia os portfólios de `inicial` para as primeiras linhas da matriz.
+
+    Portfólios incompletos (títulos que saíram do universo) mantêm os títulos
+    aleatórios já sorteados nas posições restantes.
+    """
+    for linha, indices in zip(matriz, inicial):
+        unicos = list(dict.fromkeys(indices))[:matriz.shape[1]]
+        linha[:len(unicos)] = unicos
+    return reparar_lote(matriz, n_titulos, rng)
+
+def crossover_uniforme_lote(matriz, cxpb, rng):
+    """Crossover uniforme entre pares consecutivos (0-1, 2-3, ...), como no varAnd"""
+    n_pares = len(matriz) // 2
+    pais1 = matriz[0:2 * n_pares:2]
+    pais2 = matriz[1:2 * n_pares:2]
+    cruzar = rng.random(n_pares) < cxpb
+    trocar = (rng.random(pais1.shape) >= 0.5) & cruzar[:, None]
+    filhos1 = np.where(trocar, pais2, pais1)
+    filhos2 = np.where(trocar, pais1, pais2)
+    matriz[0:2 * n_pares:2] = filhos1
+    matriz[1:2 * n_pares:2] = filhos2
+    return matriz
+
+def mutacao_substituicao_lote(matriz, mutpb, n_titulos, rng, indpb=0.3):
+    """Equivalente em lote da mutacao_inteligente: troca 30% dos títulos das linhas sorteadas"""
+    linhas = np.flatnonzero(rng.random(len(matriz)) < mutpb * indpb)
+    if len(linhas) == 0:
+        return matriz
+    n_ativos = matriz.shape[1]
+    num_mutations = max(1, int(n_ativos * 0.3))
+    posicoes = np.argsort(rng.random((len(linhas), n_ativos)), axis=1)[:, :num_mutations]
+    novos = rng.integers(0, n_titulos, posicoes.shape)
+    matriz[linhas[:, None], posicoes] = novos
+    return matriz
+
+def selecionar_melhores_lote(fits, k):
+    """Equivalente ao tools.selBest: ordem lexicográfica dos objetivos ponderados"""
+    pesos = np.asarray(creator.FitnessMulti.weights)
+    ponderados = fits * pesos
+    ordem = np.lexsort(ponderados.T[::-1])[::-1]
+    return ordem[:k]
+
+def selecionar_nsga2_lote(fits, k):
+    """Seleção NSGA-II vetorizada sobre as linhas da matriz; devolve os índices escolhidos (mesma ordem do tools.selNSGA2)"""
+    return nsga2.selecionar(fits, creator.FitnessMulti.weights, k)[0]
+
+def matriz_para_individuos(matriz, fits):
+    """Converte a matriz final em indivíduos DEAP para reaproveitar a análise de resultados"""
+    pop = []
+    for linha, fit in zip(matriz.tolist(), fits.tolist()):
+        ind = creator.Individual(linha)  # type: ignore
+        ind.fitness.values = fit
+        pop.append(ind)
+    return pop
+
+class CriterioParada:
+    """Early stopping após `early_stop_limit` gerações sem melhora.
+
+    Com parada="hipervolume" só conta como melhora um hipervolume maior que o
+    melhor anterior por pelo menos `tolerancia_hipervolume` (relativo); com
+    parada="retorno", qualquer aumento do melhor retorno.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.melhor = -np.inf
+        self.sem_melhora = 0
+
+    def atualizar(self, melhor_retorno, volume):
+        if self.config.parada == "hipervolume":
+            valor = volume
+            melhorou = valor > self.melhor and (
+                self.melhor <= 0 or (valor - self.melhor) / self.melhor > self.config.tolerancia_hipervolume
+            )
+        else:
+            valor = melhor_retorno
+            melhorou = valor > self.melhor
+        if melhorou:
+            self.melhor = valor
+            self.sem_melhora = 0
+        else:
+            self.sem_melhora += 1
+        return self.sem_melhora >= self.config.early_stop_limit
+
+# Função principal de otimização melhorada
+def rodar_otimizacao(problema, config, progresso=None, inicial=None, perfil=SEM_PERFIL):
+    """Algoritmo genético melhorado com diversidade e early stopping.
+
+    `progresso(geracao, log)` é chamado ao fim de cada geração, com o log
+    acumulado de tuplas (geração, melhor score, média da população,
+    hipervolume).
+    `inicial` (warm start) são portfólios, como listas de índices, que
+    ocupam o início da população inicial; o restante é sorteado.
+    `perfil` (perfil.Perfil) registra o tempo de cada fase por geração.
+    Com `config.n_ilhas > 1` a execução é distribuída entre processos
+    (ver ilhas.py), sempre com o motor NumPy; execuções pequenas demais para
+    compensar o custo de iniciar os processos rodam num processo só.
+    """
+    if (config.risco == "covariancia") != (problema.covariancia is not None):
+        raise ValueError("config.risco='covariancia' exige um Problema com covariância (e só ele)")
+    inicio = time.perf_counter()
+    import ilhas
+    if ilhas.n_ilhas_efetivas(config) > 1:
+        rodar = ilhas.rodar_ilhas
+    elif config.n_ilhas > 1:
+        rodar = _rodar_numpy  # pequena demais para compensar o spawn: um processo, mesmo motor das ilhas
+    else:
+        rodar = _rodar_numpy if config.motor == "numpy" else _rodar_deap
+    resultado = rodar(problema, config, progresso or (lambda g, log: None), inicial, perfil)
+    resultado.segundos = time.perf_counter() - inicio
+    resultado.perfil = perfil
+    return resultado
+
+def _rodar_deap(problema, config, progresso, inicial=None, perfil=SEM_PERFIL):
+    # Gerador próprio da execução: reprodutível e sem interferir em outras execuções
+    rng = random.Random(config.semente)
+    toolbox = criar_toolbox(problema, config, rng)
+    estatisticas_cache = Counter()
+
+    # Inicializar população
+    pop = toolbox.population(n=config.pop_size)  # type: ignore
+    for ind, indices in zip(pop, inicial or []):
+        ind[:] = toolbox.repair(list(indices))
+    # Avaliação vetorizada da população inicial
+    for ind, fit in zip(pop, avaliar_com_cache(problema, pop, estatisticas_cache)):
+        ind.fitness.values = fit  # type: ignore
+
+    log = []
+    parada = CriterioParada(config)
+    medir_hipervolume = hipervolume.Hipervolume(hipervolume.referencia_para(problema, config.n_ativos))
+    elite_size = max(1, int(config.pop_size * config.elite_size / 100))
+    monitor_diversidade = DiversidadeIncremental(problema.n_titulos, config.n_ativos)
+
+    for g in range(1, config.ngen + 1):
+        with perfil.fase(g, "variação"):
+            offspring = variar(pop, toolbox, config.cxpb, config.mutpb, rng)
+        with perfil.fase(g, "reparo"):
+            for ind in offspring:
+                ind[:] = toolbox.repair(ind)
+        # Avaliação em lote de todos os descendentes numa única passada vetorizada
+        with perfil.fase(g, "avaliação"):
+            avaliados = estatisticas_cache["misses"]
+            for ind, fit in zip(offspring, avaliar_com_cache(problema, offspring, estatisticas_cache)):
+                ind.fitness.values = fit  # type: ignore
+        perfil.contar(g, consultas=len(offspring), avaliacoes=estatisticas_cache["misses"] - avaliados)
+
+        # Elitismo melhorado
+        with perfil.fase(g, "seleção"):
+            elite = tools.selBest(pop, k=elite_size)
+            pop = toolbox.select(pop + offspring, k=config.pop_size - len(elite)) + elite  # type: ignore
+
+            # Calcular métricas
+            melhor = tools.selBest(pop, k=1)[0]
+            media = np.mean([i.fitness.values[0] for i in pop if i.fitness.valid])
+        with perfil.fase(g, "hipervolume"):
+            volume = medir_hipervolume([ind.fitness.values for ind in pop])
+        log.append((g, melhor.fitness.values[0], media, volume))
+        with perfil.fase(g, "renderização"):
+            progresso(g, log)
+
+        # Early stopping pelo hipervolume (ou pelo melhor retorno)
+        parar = parada.atualizar(melhor.fitness.values[0], volume)
+
+        # Verificar diversidade (incremental: só os indivíduos substituídos desde a última geração)
+        with perfil.fase(g, "diversidade"):
+            diversidade = monitor_diversidade.sincronizar(pop)
+        if diversidade < config.diversity_threshold and g > 10:
+            # Reinicializar parte da população para manter diversidade
+            with perfil.fase(g, "reinicialização"):
+                num_reinit = int(config.pop_size * 0.2)
+                novos = [toolbox.individual() for _ in range(num_reinit)]  # type: ignore
+                for novo_ind, fit in zip(novos, avaliar_com_cache(problema, novos, estatisticas_cache)):
+                    novo_ind.fitness.values = fit  # type: ignore
+                    pop[rng.randint(0, len(pop) - 1)] = novo_ind
+
+        if parar:
+            return ResultadoOtimizacao(pop, log, estatisticas_cache, geracao_parada=g)
+
+    return ResultadoOtimizacao(pop, log, estatisticas_cache)
+
+class PopulacaoMatriz:
+    """População do motor NumPy (matriz P x n_ativos), avançada uma geração por vez"""
+
+    def __init__(self, problema, config, rng, estatisticas_cache, inicial=None, perfil=SEM_PERFIL):
+        self.problema = problema
+        self.config = config
+        self.rng = rng
+        self.estatisticas_cache = estatisticas_cache
+        self.perfil = perfil
+        self.elite_size = max(1, int(config.pop_size * config.elite_size / 100))
+        self.pop = gerar_populacao_lote(config.pop_size, problema.n_titulos, config.n_ativos, rng)
+        if inicial:
+            self.pop = semear_lote(self.pop, inicial, problema.n_titulos, rng)
+        self.fits = np.array(avaliar_com_cache(problema, self.pop, estatisticas_cache))
+        self.monitor_diversidade = DiversidadeIncremental(problema.n_titulos, config.n_ativos)
+        self.monitor_diversidade.atualizar([], self.pop)
+        self.hipervolume = hipervolume.Hipervolume(hipervolume.referencia_para(problema, config.n_ativos))
+
+    def geracao(self, g):
+        """Variação, elitismo + NSGA-II e controle de diversidade; devolve (melhor score, média, hipervolume)"""
+        config, rng, n_titulos, perfil = self.config, self.rng, self.problema.n_titulos, self.perfil
+        pop, fits = self.pop, self.fits
+
+        with perfil.fase(g, "variação"):
+            offspring = crossover_uniforme_lote(pop.copy(), config.cxpb, rng)
+            offspring = mutacao_substituicao_lote(offspring, config.mutpb, n_titulos, rng)
+        with perfil.fase(g, "reparo"):
+            offspring = reparar_lote(offspring, n_titulos, rng)
+        with perfil.fase(g, "avaliação"):
+            avaliados = self.estatisticas_cache["misses"]
+            fits_offspring = np.array(avaliar_com_cache(self.problema, offspring, self.estatisticas_cache))
+        perfil.contar(g, consultas=len(offspring), avaliacoes=self.estatisticas_cache["misses"] - avaliados)
+
+        # Elitismo + NSGA-II sobre pais e descendentes
+        with perfil.fase(g, "seleção"):
+            elite = selecionar_melhores_lote(fits, self.elite_size)
+            uniao = np.concatenate([pop, offspring])
+            fits_uniao = np.concatenate([fits, fits_offspring])
+            escolhidos = selecionar_nsga2_lote(fits_uniao, config.pop_size - len(elite))
+            pop_anterior = pop
+            pop = np.concatenate([uniao[escolhidos], pop[elite]])
+            fits = np.concatenate([fits_uniao[escolhidos], fits[elite]])
+
+            melhor = fits[selecionar_melhores_lote(fits, 1)[0]]
+            media = fits[:, 0].mean()
+
+        with perfil.fase(g, "diversidade"):
+            # Linhas dos pais que saíram (ou foram duplicadas) e descendentes que entraram
+            multiplicidade = np.bincount(
+                np.concatenate([escolhidos[escolhidos < len(pop_anterior)], elite]), minlength=len(pop_anterior)
+            ) - 1
+            removidos = np.repeat(pop_anterior, np.clip(-multiplicidade, 0, None), axis=0)
+            adicionados = np.concatenate([
+                np.repeat(pop_anterior, np.clip(multiplicidade, 0, None), axis=0),
+                uniao[escolhidos[escolhidos >= len(pop_anterior)]],
+            ])
+            diversidade = self.monitor_diversidade.atualizar(removidos, adicionados)
+        if diversidade < config.diversity_threshold and g > 10:
+            with perfil.fase(g, "reinicialização"):
+                num_reinit = int(config.pop_size * 0.2)
+                novos = gerar_populacao_lote(num_reinit, n_titulos, config.n_ativos, rng)
+                posicoes = rng.integers(0, len(pop), num_reinit)
+                substituidas = np.unique(posicoes)
+                anteriores = pop[substituidas].copy()
+                pop[posicoes] = novos
+                fits[posicoes] = avaliar_com_cache(self.problema, novos, self.estatisticas_cache)
+                self.monitor_diversidade.atualizar(anteriores, pop[substituidas])
+
+        self.pop, self.fits = pop, fits
+        with perfil.fase(g, "hipervolume"):
+            volume = self.hipervolume(fits)
+        return melhor[0], media, volume
+
+    def emigrantes(self, n):
+        """Cópias dos n melhores indivíduos pela ordem do NSGA-II (primeira frente e crowding)"""
+        escolhidos = selecionar_nsga2_lote(self.fits, n)
+        return self.pop[escolhidos].copy(), self.fits[escolhidos].copy()
+
+    def receber(self, linhas, fits):
+        """Substitui os piores indivíduos (pela ordem do NSGA-II) pelos imigrantes"""
+        if len(linhas) == 0:
+            return
+        manter = np.zeros(len(self.pop), dtype=bool)
+        manter[selecionar_nsga2_lote(self.fits, len(self.pop) - len(linhas))] = True
+        self.monitor_diversidade.atualizar(self.pop[~manter], linhas)
+        self.pop = np.concatenate([self.pop[manter], linhas])
+        self.fits = np.concatenate([self.fits[manter], fits])
+
+    def individuos(self):
+        return matriz_para_individuos(self.pop, self.fits)
+
+def _rodar_numpy(problema, config, progresso, inicial=None, perfil=SEM_PERFIL):
+    """Mesmo algoritmo do motor DEAP, com a população guardada numa matriz NumPy"""
+    estatisticas_cache = Counter()
+    populacao = PopulacaoMatriz(
+        problema, config, np.random.default_rng(config.semente), estatisticas_cache, inicial, perfil
+    )
+
+    log = []
+    parada = CriterioParada(config)
+
+    for g in range(1, config.ngen + 1):
+        melhor, media, volume = populacao.geracao(g)
+        log.append((g, melhor, media, volume))
+        with perfil.fase(g, "renderização"):
+            progresso(g, log)
+
+        if parada.atualizar(melhor, volume):
+            return ResultadoOtimizacao(populacao.individuos(), log, estatisticas_cache, geracao_parada=g)
+
+    return ResultadoOtimizacao(populacao.individuos(), log, estatisticas_cache)
+
+def portfolios_semente(resultado, elite_size):
+    """Fronteira de Pareto e elite (`elite_size`% da população) de um resultado, sem repetições, para warm start.
+
+    O portfólio não depende da ordem dos títulos: a mesma combinação em outra
+    ordem é uma repetição.
+    """
+    elite = tools.selBest(resultado.populacao, k=max(1, int(len(resultado.populacao) * elite_size / 100)))
+    unicos = {}
+    for ind in resultado.pareto + elite:
+        unicos.setdefault(tuple(sorted(ind)), list(ind))
+    return list(unicos.values())
+
+def geracoes_ate_convergir(resultado):
+    """Geração em que a execução convergiu (early stopping) ou, sem parada, a última geração rodada"""
+    if resultado.geracao_parada is not None:
+        return resultado.geracao_parada
+    return resultado.log[-1][0] if resultado.log else 0
+
+def fronteira_pareto(populacao):
+    """Portfólios não-dominados da população final"""
+    return nsga2.sortNondominated(populacao, k=len(populacao), first_front_only=True)[0]
+
+def tabela_pareto(pareto):
+    return pd.DataFrame([
+        {
+            'Retorno (%)': ind.fitness.values[0],
+            'Risco (%)': ind.fitness.values[1],
+            'Diversidade': int(ind.fitness.values[2]),
+            'Índices': list(ind),
+        }
+        for ind in pareto
+    ])
@@ -0,0 +1,156 @@
+"""Ordenação não-dominada e crowding distance vetorizadas para o NSGA-II.
+
+Substitui tools.sortNondominated/tools.selNSGA2 do DEAP com o mesmo resultado
+(mesmos indivíduos, na mesma ordem), calculado sobre arrays de fitness.
+
+Cada fronteira é extraída numa varredura: com os pontos ordenados pelo
+primeiro objetivo, qualquer dominador de um ponto vem antes dele, e basta
+comparar o segundo objetivo com o máximo acumulado dos pontos anteriores que
+não perdem no terceiro. Como o terceiro objetivo (diversidade) só assume
+poucos valores inteiros, há um máximo acumulado por nível: O(níveis x n) por
+fronteira, em vez das O(n²) comparações do DEAP.
+"""
+import numpy as np
+
+
+def _nao_dominados(w, restantes, nivel, niveis):
+    """Máscara dos pontos de `restantes` que nenhum outro ponto de `restantes` domina.
+
+    `w` são os objetivos ponderados (maximização), sem linhas repetidas e
+    ordenados de modo decrescente; `nivel[i]` é a posição de w[i, 2] em `niveis`.
+    """
+    n = len(w)
+    segundo = np.where(restantes[None, :] & (w[None, :, 2] >= niveis[:, None]), w[None, :, 1], -np.inf)
+    anteriores = np.full((len(niveis), n), -np.inf)
+    anteriores[:, 1:] = np.maximum.accumulate(segundo, axis=1)[:, :-1]
+    dominado = anteriores[nivel, np.arange(n)] >= w[:, 1]
+    return restantes & ~dominado
+
+
+def _domina(a, b):
+    """Matriz len(a) x len(b): a[i] domina b[j] (objetivos ponderados)"""
+    maior_igual = (a[:, None, :] >= b[None, :, :]).all(axis=2)
+    return maior_igual & (a[:, None, :] > b[None, :, :]).any(axis=2)
+
+
+def ordenar_fronteiras(valores, pesos, k=None, primeira_apenas=False):
+    """Fronteiras de Pareto como arrays de índices das linhas de `valores`.
+
+    Mesmo resultado do tools.sortNondominated: as fronteiras são geradas até
+    cobrir min(n, k) linhas, na mesma ordem de fronteiras e de indivíduos.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = len(valores)
+    k = n if k is None else k
+    if k == 0 or n == 0:
+        return []
+    w = valores * np.asarray(pesos, dtype=np.float64)
+
+    # Fitness distintos, numerados pela ordem da primeira ocorrência (como o DEAP)
+    _, primeiro, inverso = np.unique(w, axis=0, return_index=True, return_inverse=True)
+    ordem = np.argsort(primeiro)
+    numero = np.empty(len(ordem), dtype=np.intp)
+    numero[ordem] = np.arange(len(ordem))
+    grupo = numero[inverso.ravel()]
+    distintos = w[primeiro[ordem]]
+    tamanho = np.bincount(grupo, minlength=len(distintos))
+
+    # Varredura em ordem decrescente: dominadores sempre antes dos dominados
+    varredura = np.lexsort((-distintos[:, 2], -distintos[:, 1], -distintos[:, 0]))
+    wv = distintos[varredura]
+    niveis = np.unique(wv[:, 2])
+    nivel = np.searchsorted(niveis, wv[:, 2])
+
+    fronteiras = []
+    restantes = np.ones(len(wv), dtype=bool)
+    ordenados = 0
+    anterior = None
+    while ordenados < min(n, k) and restantes.any():
+        atual = _nao_dominados(wv, restantes, nivel, niveis)
+        restantes &= ~atual
+        fits = np.sort(varredura[atual])
+        if anterior is not None:
+            # No DEAP, um fitness entra na fronteira quando o último dos seus
+            # dominadores na fronteira anterior é processado
+            dominadores = _domina(distintos[anterior], distintos[fits])
+            ultimo = len(anterior) - 1 - np.argmax(dominadores[::-1], axis=0)
+            fits = fits[np.lexsort((fits, ultimo))]
+        posicao = np.full(len(distintos), -1)
+        posicao[fits] = np.arange(len(fits))
+        membros = np.flatnonzero(posicao[grupo] >= 0)
+        fronteiras.append(membros[np.lexsort((membros, posicao[grupo[membros]]))])
+        ordenados += int(tamanho[fits].sum())
+        anterior = fits
+        if primeira_apenas:
+            break
+    return fronteiras
+
+
+def distancia_aglomeracao(valores):
+    """Crowding distance de uma fronteira, igual à do tools.assignCrowdingDist"""
+    valores = np.asarray(valores, dtype=np.float64)
+    m, nobj = valores.shape
+    distancias = np.zeros(m)
+    if m == 0:
+        return distancias
+    ordem = np.arange(m)
+    for i in range(nobj):
+        # Ordenações estáveis encadeadas, como o crowd.sort do DEAP
+        ordem = ordem[np.argsort(valores[ordem, i], kind="stable")]
+        coluna = valores[ordem, i]
+        distancias[ordem[0]] = distancias[ordem[-1]] = np.inf
+        if coluna[-1] == coluna[0]:
+            continue
+        norma = nobj * float(coluna[-1] - coluna[0])
+        distancias[ordem[1:-1]] += (coluna[2:] - coluna[:-2]) / norma
+    return distancias
+
+
+def selecionar(valores, pesos, k, identidade=None):
+    """Índices escolhidos pelo NSGA-II, na ordem do tools.selNSGA2, e a crowding distance de cada linha ordenada.
+
+    `identidade` marca linhas que são o mesmo objeto (o mesmo indivíduo
+    listado duas vezes): no DEAP elas compartilham fitness.crowding_dist, que
+    fica com o valor da última ocorrência na fronteira.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    fronteiras = ordenar_fronteiras(valores, pesos, k)
+    distancias = np.full(len(valores), np.nan)
+    for fronteira in fronteiras:
+        distancias[fronteira] = distancia_aglomeracao(valores[fronteira])
+        if identidade is not None:
+            objetos, ultima = np.unique(identidade[fronteira][::-1], return_index=True)
+            if len(objetos) < len(fronteira):
+                compartilhada = distancias[fronteira][len(fronteira) - 1 - ultima]
+                distancias[fronteira] = compartilhada[np.searchsorted(objetos, identidade[fronteira])]
+    if not fronteiras:
+        return np.empty(0, dtype=np.intp), distancias
+
+    escolhidos = fronteiras[:-1]
+    faltam = k - sum(map(len, escolhidos))
+    if faltam > 0:
+        ultima = fronteiras[-1]
+        escolhidos.append(ultima[np.argsort(-distancias[ultima], kind="stable")][:faltam])
+    return np.concatenate(escolhidos) if escolhidos else np.empty(0, dtype=np.intp), distancias
+
+
+def selNSGA2(individuals, k):
+    """Substituto do tools.selNSGA2 para registrar no toolbox; também preenche fitness.crowding_dist"""
+    if not individuals:
+        return []
+    valores = [ind.fitness.values for ind in individuals]
+    identidade = np.array([id(ind) for ind in individuals], dtype=np.uint64)
+    escolhidos, distancias = selecionar(valores, individuals[0].fitness.weights, k, identidade)
+    for ind, distancia in zip(individuals, distancias.tolist()):
+        if distancia == distancia:  # só indivíduos das fronteiras ordenadas
+            ind.fitness.crowding_dist = distancia
+    return [individuals[i] for i in escolhidos.tolist()]
+
+
+def sortNondominated(individuals, k, first_front_only=False):
+    """Substituto do tools.sortNondominated"""
+    if not individuals:
+        return []
+    valores = [ind.fitness.values for ind in individuals]
+    fronteiras = ordenar_fronteiras(valores, individuals[0].fitness.weights, k, first_front_only)
+    return [[individuals[i] for i in fronteira.tolist()] for fronteira in fronteiras]
@@ -0,0 +1,123 @@
+"""Tempos por geração e por fase do GA, com exportação em JSON e Chrome trace.
+
+Os motores envolvem cada fase com `perfil.fase(g, "avaliação")`. O perfil nulo
+(`NULO`, padrão de motor.rodar_otimizacao) devolve sempre o mesmo gerenciador
+de contexto vazio, então a instrumentação pode ficar ligada no código sem
+custo perceptível quando não há medição.
+"""
+import time
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+FASES = ("variação", "reparo", "avaliação", "seleção", "diversidade", "reinicialização", "hipervolume", "renderização")
+
+
+class _Fase:
+    __slots__ = ("perfil", "geracao", "nome", "inicio")
+
+    def __init__(self, perfil, geracao, nome):
+        self.perfil, self.geracao, self.nome = perfil, geracao, nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+
+    def __exit__(self, *excecao):
+        self.perfil.eventos.append((self.geracao, self.nome, self.inicio, time.perf_counter_ns() - self.inicio, 0))
+
+
+class _SemMedicao:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *excecao):
+        pass
+
+
+class PerfilNulo:
+    """Não mede nada; usado quando a instrumentação está desligada"""
+
+    ativo = False
+    _vazio = _SemMedicao()
+
+    def fase(self, geracao, nome):
+        return self._vazio
+
+    def contar(self, geracao, **contagens):
+        pass
+
+
+NULO = PerfilNulo()
+
+
+class Perfil:
+    """Eventos (geração, fase, início ns, duração ns, trilha) e contagens por geração.
+
+    A trilha separa as ilhas no Chrome trace (0 no processo principal).
+    """
+
+    ativo = True
+
+    def __init__(self):
+        self.eventos = []
+        self.contagens = defaultdict(Counter)
+
+    def fase(self, geracao, nome):
+        return _Fase(self, geracao, nome)
+
+    def contar(self, geracao, **contagens):
+        self.contagens[geracao].update(contagens)
+
+    def incorporar(self, eventos, contagens, trilha):
+        """Junta os eventos e contagens de outro perfil (por exemplo, de uma ilha)"""
+        self.eventos.extend((g, nome, inicio, duracao, trilha) for g, nome, inicio, duracao, _ in eventos)
+        for g, contagem in contagens.items():
+            self.contagens[g].update(contagem)
+
+    def tabela(self):
+        """Segundos por geração (linhas) e fase (colunas), somados entre ilhas"""
+        if not self.eventos:
+            return pd.DataFrame(columns=[], index=pd.Index([], name="Geração"))
+        segundos = pd.DataFrame(self.eventos, columns=["Geração", "Fase", "inicio", "duracao", "trilha"])
+        segundos["Segundos"] = segundos["duracao"] / 1e9
+        tabela = segundos.pivot_table(index="Geração", columns="Fase", values="Segundos", aggfunc="sum", fill_value=0.0)
+        return tabela.reindex(columns=[f for f in FASES if f in tabela.columns])
+
+    def como_dict(self):
+        tabela = self.tabela()
+        return {
+            "fases": list(tabela.columns),
+            "totais_segundos": {fase: float(tabela[fase].sum()) for fase in tabela.columns},
+            "geracoes": [
+                {"geracao": int(g), "segundos": {fase: float(v) for fase, v in linha.items()}, **self.contagens.get(g, {})}
+                for g, linha in tabela.iterrows()
+            ],
+        }
+
+    def trace_chrome(self):
+        """Eventos no formato Trace Event (chrome://tracing, Perfetto)"""
+        origem = min((inicio for _, _, inicio, _, _ in self.eventos), default=0)
+        trilhas = sorted({trilha for *_, trilha in self.eventos})
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {"name": "thread_name", "ph": "M", "pid": 1, "tid": trilha,
+                 "args": {"name": f"ilha {trilha}" if trilha else "principal"}}
+                for trilha in trilhas
+            ] + [
+                {"name": nome, "cat": "ga", "ph": "X", "pid": 1, "tid": trilha,
+                 "ts": (inicio - origem) / 1e3, "dur": duracao / 1e3, "args": {"geracao": g}}
+                for g, nome, inicio, duracao, trilha in self.eventos
+            ],
+        }
+
+
+def juntar(*perfis):
+    """Um perfil com os eventos e contagens de vários (os nulos são ignorados)"""
+    junto = Perfil()
+    for perfil in perfis:
+        if perfil.ativo:
+            junto.eventos.extend(perfil.eventos)
+            for g, contagem in perfil.contagens.items():
+                junto.contagens[g].update(contagem)
+    return junto